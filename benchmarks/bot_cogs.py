@@ -0,0 +1,372 @@
+"""
+Offline benchmark of the bot's Monitor cog.
+
+Runs the cog on a bot that never connects to Discord, with stub guilds,
+channels and messages that record edits instead of sending them, and a fake
+clock that timestamps every door change, so nothing needs a connection and
+every run does the same work. It measures:
+
+- `-link` and announcements across thousands of linked guilds
+- `-history` pages over a million entry history, clicking through `PageView`
+- `Protocol.data_received` at a high frame rate
+- `-logs` on a large log file
+
+Each timing is the median of several repeats, and the report is printed in
+a fixed layout, so runs can be compared across commits.
+
+Usage, from the root of the repository:
+
+    python benchmarks/bot_cogs.py
+    python benchmarks/bot_cogs.py --guilds 5000 --history 2000000 --repeat 9
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "monitor"), os.path.join(ROOT, "bot")]
+
+import discord  # noqa: E402
+from discord.ext import commands  # noqa: E402
+
+from transport import encode_frame  # noqa: E402
+from util.history import HistoryPoint  # noqa: E402
+from util.history_store import HistoryStore  # noqa: E402
+from util.occupancy import Occupancy  # noqa: E402
+from util.page import PageView  # noqa: E402
+import cogs.monitor as monitor_cog  # noqa: E402
+from cogs.monitor import DataHandler, Monitor, Protocol  # noqa: E402
+
+
+class FakeClock:
+    """
+    A clock that only moves when it's told to
+    """
+
+    def __init__(self, start: float = 1_700_000_000.0) -> None:
+        self.now = start
+
+    def advance(self, seconds: float) -> float:
+        self.now += seconds
+        return self.now
+
+    def datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.now)
+
+
+class FakeDataHandler(DataHandler):
+    """
+    DataHandler that reads the time from a fake clock
+    """
+
+    def __init__(self, clock: FakeClock) -> None:
+        self.clock = clock
+        super().__init__()
+
+    def timestamp(self) -> datetime:
+        return self.clock.datetime()
+
+
+class FakeMessage:
+    """
+    A message that counts its edits instead of sending them to Discord
+    """
+
+    def __init__(self, channel: "FakeChannel", id: int, latency: float) -> None:
+        self.channel = channel
+        self.id = id
+        self.latency = latency
+        self.edits = 0
+
+    async def edit(self, embed: discord.Embed) -> "FakeMessage":
+        await asyncio.sleep(self.latency)
+        self.edits += 1
+        return self
+
+
+class FakeChannel:
+    def __init__(self, id: int, latency: float) -> None:
+        self.id = id
+        self.mention = f"<#{id}>"
+        self.latency = latency
+
+    async def send(self, embed: discord.Embed, file: discord.File) -> FakeMessage:
+        await asyncio.sleep(self.latency)
+        return FakeMessage(self, self.id * 10, self.latency)
+
+
+class FakeGuild:
+    def __init__(self, id: int) -> None:
+        self.id = id
+
+
+class FakeResponse:
+    def __init__(self) -> None:
+        self.edits = 0
+
+    async def edit_message(self, embed: discord.Embed, view: discord.ui.View) -> None:
+        self.edits += 1
+
+
+class FakeInteraction:
+    """
+    A button click, whose response counts the edits to the clicked message
+    """
+
+    def __init__(self) -> None:
+        self.response = FakeResponse()
+
+
+class FakeContext:
+    """
+    A command context that keeps what the command sends
+    """
+
+    def __init__(self, guild: Optional[FakeGuild] = None) -> None:
+        self.guild = guild
+        self.author = None
+        self.sent = []
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> None:
+        self.sent.append(content)
+
+
+async def timed(func: Callable[[], Awaitable], repeat: int) -> float:
+    """
+    Return the median seconds `func` takes over `repeat` runs
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+async def peak_memory(func: Callable[[], Awaitable]) -> float:
+    """
+    Run `func` once, returning the most memory it had allocated at once, in MB
+    """
+    tracemalloc.start()
+    try:
+        await func()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def report(name: str, value: float, unit: str) -> None:
+    print(f"{name:<44} {value:>12.3f} {unit}")
+
+
+def new_bot() -> commands.Bot:
+    return commands.Bot(command_prefix="-", intents=discord.Intents.none())
+
+
+async def bench_announcements(args: argparse.Namespace, tmp: str) -> None:
+    clock = FakeClock()
+    cog = Monitor(new_bot(), links_db=os.path.join(tmp, "links.db"))
+    cog.data_handler = FakeDataHandler(clock)
+    await cog.cog_load()
+
+    channels = [FakeChannel(i + 1, args.edit_latency) for i in range(args.guilds)]
+
+    async def link_all():
+        for i, channel in enumerate(channels):
+            await Monitor.link_channel.callback(
+                cog, FakeContext(FakeGuild(i + 1)), channel
+            )
+
+    start = time.perf_counter()
+    await link_all()
+    report("link: per guild", (time.perf_counter() - start) / args.guilds * 1000, "ms")
+
+    async def change():
+        cog.data_handler.update(not cog.data_handler.data, clock.advance(1))
+        await cog.send_announcement()
+
+    edits = cog.fanout.edited
+    elapsed = await timed(change, args.repeat)
+    per_run = (cog.fanout.edited - edits) / args.repeat
+    report(f"announce change: {per_run:.0f} edits", elapsed * 1000, "ms")
+    report("announce change: edits per second", per_run / elapsed, "edits/s")
+
+    edits = cog.fanout.edited
+    elapsed = await timed(cog.send_announcement, args.repeat)
+    per_run = (cog.fanout.edited - edits) / args.repeat
+    report(f"announce unchanged: {per_run:.0f} edits", elapsed * 1000, "ms")
+
+    await cog._close()
+
+
+async def bench_history(args: argparse.Namespace, tmp: str) -> None:
+    clock = FakeClock()
+    path = os.path.join(tmp, "history.db")
+    rng = random.Random(args.seed)
+
+    # the door changes every few minutes to hours, alternating
+    store = HistoryStore(path)
+    await store.open()
+    points = []
+    is_open = False
+    for _ in range(args.history):
+        is_open = not is_open
+        points.append(HistoryPoint(int(clock.advance(rng.uniform(60, 7200))), is_open))
+    # stored with its rollups, as the cog stores every change
+    occupancy = Occupancy()
+    occupancy.extend(points)
+    await store.append(points, occupancy)
+    await store.close()
+    del points, occupancy
+
+    # tracing allocations slows the load down, so it's timed and measured separately
+    cog = Monitor(new_bot(), history_db=path)
+    start = time.perf_counter()
+    await cog.cog_load()
+    report(f"history: load {args.history} entries", time.perf_counter() - start, "s")
+    await cog._close()
+
+    cog = Monitor(new_bot(), history_db=path)
+    cog.data_handler = FakeDataHandler(clock)
+    report("history: load peak memory", await peak_memory(cog.cog_load), "MB")
+
+    async def change():
+        cog.data_handler.update(not cog.data_handler.data, clock.advance(60))
+        await cog.send_announcement()
+
+    async def first_page():
+        await change()
+        await cog.get_page(0)
+
+    report("get_page: first page after a change", await timed(first_page, args.repeat) * 1000, "ms")
+    report("get_page: first page, cached", await timed(lambda: cog.get_page(0), args.repeat) * 1000, "ms")
+
+    async def last_page():
+        await change()
+        await cog.get_page(cog.get_total_pages() - 1)
+
+    report("get_page: last page after a change", await timed(last_page, args.repeat) * 1000, "ms")
+
+    view = PageView(None, cog.get_page, cog.get_total_pages)
+    interaction = FakeInteraction()
+    clicks = 200
+
+    async def click_through():
+        view.page = 0
+        for _ in range(clicks):
+            await view.next.callback(interaction)
+
+    # the first pass renders from memory and the store, later ones are cached
+    start = time.perf_counter()
+    await click_through()
+    report("PageView: next click, cold", (time.perf_counter() - start) / clicks * 1000, "ms")
+    report("PageView: next click, cached", await timed(click_through, args.repeat) / clicks * 1000, "ms")
+
+    async def change_and_click():
+        await change()
+        await click_through()
+
+    report(
+        "PageView: next click after a change",
+        await timed(change_and_click, args.repeat) / clicks * 1000,
+        "ms",
+    )
+    await cog._close()
+
+
+async def bench_protocol(args: argparse.Namespace) -> None:
+    clock = FakeClock()
+    stream = b"".join(
+        encode_frame(i, clock.advance(0.001), i % 2 == 0) for i in range(args.frames)
+    )
+    chunks = [stream[i : i + 4096] for i in range(0, len(stream), 4096)]
+
+    async def receive():
+        protocol = Protocol(FakeDataHandler(clock))
+        for chunk in chunks:
+            protocol.data_received(chunk)
+        assert len(protocol.dh.transitions) == args.frames, "frames were lost"
+
+    elapsed = await timed(receive, args.repeat)
+    report("data_received: frames per second", args.frames / elapsed, "frames/s")
+    report("data_received: per 4 KiB chunk", elapsed / len(chunks) * 1e6, "us")
+
+
+async def bench_logs(args: argparse.Namespace, tmp: str) -> None:
+    clock = FakeClock()
+    path = os.path.join(tmp, "monitor.log")
+    rng = random.Random(args.seed)
+    levels = ["DEBUG"] * 80 + ["INFO"] * 18 + ["WARNING"] * 2
+    with open(path, "w") as f:
+        for i in range(args.log_lines):
+            when = datetime.fromtimestamp(clock.advance(0.5))
+            f.write(
+                f"{when:%Y-%m-%d %H:%M:%S},{when.microsecond // 1000:03}:"
+                f"{rng.choice(levels)}:__main__:door is {'open' if i % 2 else 'closed'}\n"
+            )
+    end = clock.datetime()
+
+    # the cog reads the log location from the .env file
+    dotenv = monitor_cog.dotenv
+    monitor_cog.dotenv = argparse.Namespace(
+        dotenv_values=lambda: {"MONITOR_LOG_LOCATION": path}
+    )
+    cog = Monitor(new_bot())
+    # durations are relative to the real clock, so the window is given as timestamps
+    since = (end - timedelta(hours=2)).replace(microsecond=0).isoformat()
+    until = (end - timedelta(hours=1)).replace(microsecond=0).isoformat()
+    try:
+        for name, command in (
+            ("-logs 20", (20,)),
+            ("-logs 20 warning", (20, "warning")),
+            ("-logs 2000", (2000,)),
+            ("-logs 50 all 2h 1h", (50, "all", since, until)),
+        ):
+            elapsed = await timed(
+                lambda: Monitor.get_logs.callback(cog, FakeContext(), *command),
+                args.repeat,
+            )
+            report(name, elapsed * 1000, "ms")
+    finally:
+        monitor_cog.dotenv = dotenv
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"{'benchmark':<44} {'value':>12} unit")
+    with tempfile.TemporaryDirectory() as tmp:
+        await bench_announcements(args, tmp)
+        await bench_history(args, tmp)
+        await bench_protocol(args)
+        await bench_logs(args, tmp)
+    # ru_maxrss is in kilobytes on Linux
+    report("process peak RSS", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, "MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--guilds", type=int, default=2000, help="linked guilds")
+    parser.add_argument(
+        "--edit-latency",
+        type=float,
+        default=0,
+        help="seconds each fake message send and edit takes",
+    )
+    parser.add_argument("--history", type=int, default=1_000_000, help="history entries")
+    parser.add_argument("--frames", type=int, default=200_000, help="frames to receive")
+    parser.add_argument("--log-lines", type=int, default=500_000, help="log file lines")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per timing, of which the median is reported")
+    parser.add_argument("--seed", type=int, default=0, help="seed for generated data")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
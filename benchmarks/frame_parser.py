@@ -0,0 +1,72 @@
+"""
+Throughput benchmark of the bot's streaming frame parser.
+
+Encodes frames exactly as the monitor does, then feeds them to the bot's
+FrameParser in randomly sized chunks, so that frames are both coalesced
+and split across chunks. It checks that every frame came back intact and
+reports how many frames per second the parser keeps up with.
+
+Usage, from the root of the repository:
+
+    python benchmarks/frame_parser.py --frames 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "monitor"), os.path.join(ROOT, "bot")]
+
+from transport import encode_frame  # noqa: E402
+from util.frames import FrameParser  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=int, default=200000, help="frames to parse")
+    parser.add_argument("--sensors", type=int, default=1, help="sensors to tag frames with")
+    parser.add_argument("--max-chunk", type=int, default=4096, help="largest chunk, in bytes")
+    parser.add_argument("--seed", type=int, default=0, help="chunking seed")
+    args = parser.parse_args()
+
+    now = time.time()
+    sensors = [None] if args.sensors == 1 else [f"door{i}" for i in range(args.sensors)]
+    stream = b"".join(
+        encode_frame(i, now + i / 1000, i % 2 == 0, sensors[i % len(sensors)])
+        for i in range(args.frames)
+    )
+
+    rng = random.Random(args.seed)
+    chunks = []
+    position = 0
+    while position < len(stream):
+        size = rng.randint(1, args.max_chunk)
+        chunks.append(stream[position : position + size])
+        position += size
+
+    frame_parser = FrameParser()
+    parsed = 0
+    opens = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        for frame in frame_parser.feed(chunk):
+            parsed += 1
+            opens += frame.is_open
+    elapsed = time.perf_counter() - start
+
+    assert parsed == args.frames, f"parsed {parsed} of {args.frames} frames"
+    assert opens == (args.frames + 1) // 2, "frames were corrupted"
+    print(f"frames:           {parsed}")
+    print(f"chunks:           {len(chunks)}")
+    print(f"bytes:            {len(stream)}")
+    print(f"malformed:        {frame_parser.malformed}")
+    print(f"sequence gaps:    {frame_parser.gaps}")
+    print(f"elapsed:          {elapsed:.3f} s")
+    print(f"throughput:       {parsed / elapsed:.0f} frames/s")
+    print(f"                  {len(stream) / elapsed / 1e6:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+End to end benchmark of the monitor pipeline.
+
+A ReplayMonitor plays a trace of door changes through a StatusUpdater into a
+local Protocol server, and the Monitor cog moves them into its history. The
+benchmark reports throughput, the latency from the sensor reading to the
+change landing in `Monitor.history`, and how many changes never made it.
+
+Usage, from the root of the repository:
+
+    python benchmarks/monitor_pipeline.py --events 10000 --rate 2000
+    python benchmarks/monitor_pipeline.py --trace monitor/outbox.spool --speedup 100
+    python benchmarks/monitor_pipeline.py --events 1000 --rate 1 --push
+    python benchmarks/monitor_pipeline.py --transport shm --push
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the monitor goes first, since both services have a main.py
+sys.path[:0] = [os.path.join(ROOT, "monitor"), os.path.join(ROOT, "bot")]
+
+import discord  # noqa: E402
+from discord.ext import commands  # noqa: E402
+
+from main import StatusUpdater  # noqa: E402
+from physical_monitor import ReplayMonitor, load_trace, synthetic_trace  # noqa: E402
+from cogs.monitor import DataHandler, Monitor, Protocol  # noqa: E402
+from util.shared_status import SharedStatusReader  # noqa: E402
+
+logger = logging.getLogger("benchmark")
+
+
+class TimedDataHandler(DataHandler):
+    """
+    DataHandler that also keeps the exact sensor timestamp of every transition,
+    since the history only stores whole seconds
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sensor_times = []
+        self.updates = 0
+
+    def update(
+        self, val: bool, sensor_timestamp: float, sensor: Optional[str] = None
+    ) -> None:
+        before = len(self.transitions)
+        super().update(val, sensor_timestamp, sensor)
+        if len(self.transitions) > before:
+            self.sensor_times.append(sensor_timestamp)
+        self.updates += 1
+
+
+def time_announcements(cog: Monitor, dh: TimedDataHandler, latencies: list) -> None:
+    """
+    Make every announcement record the latency of every transition it adds to the history
+    """
+    send_announcement = cog.send_announcement
+
+    async def timed_announcement() -> None:
+        count = len(dh.transitions)
+        await send_announcement()
+        now = time.time()
+        latencies.extend(now - timestamp for timestamp in dh.sensor_times[:count])
+        del dh.sensor_times[:count]
+
+    cog.send_announcement = timed_announcement
+
+
+def count_changes(trace, initial: bool) -> int:
+    changes = 0
+    state = initial
+    for _, open in trace:
+        if open != state:
+            changes += 1
+            state = open
+    return changes
+
+
+async def run(args: argparse.Namespace) -> None:
+    if args.trace is not None:
+        trace = load_trace(args.trace)
+    else:
+        trace = synthetic_trace(args.events, args.rate, args.seed)
+    initial = not trace[0][1]
+
+    bot = commands.Bot(command_prefix="-", intents=discord.Intents.none())
+    cog = Monitor(bot, max_history_len=len(trace) + 1)
+    dh = TimedDataHandler()
+    cog.data_handler = dh
+
+    loop = asyncio.get_running_loop()
+    latencies = []
+    time_announcements(cog, dh, latencies)
+    announcer = asyncio.create_task(cog.announce_changes()) if args.push else None
+    with tempfile.TemporaryDirectory() as tmp:
+        vals = {
+            "DOOR_TRANSPORT": args.transport,
+            "DOOR_SOCKET_PATH": os.path.join(tmp, "door.sock"),
+            "DOOR_SHM_PATH": os.path.join(tmp, "door.shm"),
+            "OUTBOX_LOCATION": os.path.join(tmp, "outbox.spool"),
+        }
+        if args.transport == "tcp":
+            server = await loop.create_server(lambda: Protocol(dh), "localhost", 0)
+            vals["DOOR_TCP_ENDPOINT"] = f"localhost:{server.sockets[0].getsockname()[1]}"
+        elif args.transport == "unix":
+            server = await loop.create_unix_server(
+                lambda: Protocol(dh), vals["DOOR_SOCKET_PATH"]
+            )
+        else:
+            server = SharedStatusReader(
+                vals["DOOR_SHM_PATH"], lambda: Protocol(dh), args.shm_poll
+            )
+            await server.start()
+        updater = StatusUpdater(vals)
+        monitor = ReplayMonitor(
+            args.refresh_every, updater, logger, trace, args.speedup, initial
+        )
+
+        start = time.perf_counter()
+        worker = loop.run_in_executor(None, monitor.start)
+        while not worker.done():
+            if announcer is None:
+                await cog.send_announcement()
+            await asyncio.sleep(args.drain_every)
+        elapsed = time.perf_counter() - start
+
+        # give the last frames time to arrive
+        await asyncio.sleep(0.2)
+        if announcer is not None:
+            announcer.cancel()
+        await cog.send_announcement()
+        updater.close()
+        server.close()
+        await server.wait_closed()
+
+    # the initial state is recorded in the history too
+    expected = count_changes(trace, initial) + 1
+    print(f"transport:            {args.transport}")
+    print(f"events in trace:      {len(trace)}")
+    print(f"elapsed:              {elapsed:.3f} s")
+    print(f"throughput:           {len(trace) / elapsed:.0f} events/s")
+    print(f"frames sent:          {updater.seq}")
+    print(f"frames received:      {dh.updates}")
+    print(f"history points:       {len(cog.history)} / {expected}")
+    print(f"dropped events:       {expected - len(cog.history)}")
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+        print(f"latency p50:          {quantiles[49] * 1000:.2f} ms")
+        print(f"latency p99:          {quantiles[98] * 1000:.2f} ms")
+        print(f"latency max:          {max(latencies) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--trace", help="trace file to replay instead of a synthetic trace")
+    parser.add_argument("--events", type=int, default=10000, help="synthetic trace length")
+    parser.add_argument("--rate", type=float, default=1000, help="synthetic changes per second")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic trace seed")
+    parser.add_argument("--speedup", type=float, default=1, help="replay speed multiplier")
+    parser.add_argument(
+        "--refresh-every", type=float, default=1, help="seconds between heartbeats"
+    )
+    parser.add_argument(
+        "--drain-every",
+        type=float,
+        default=0.01,
+        help="seconds between announcements that move changes into the history",
+    )
+    parser.add_argument(
+        "--push",
+        action="store_true",
+        help="announce changes as they arrive, like the bot does, instead of every --drain-every seconds",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["tcp", "unix", "shm"],
+        default="tcp",
+        help="how the monitor sends frames to the bot",
+    )
+    parser.add_argument(
+        "--shm-poll",
+        type=float,
+        default=0.01,
+        help="seconds between checks of the shared memory block, with --transport shm",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,25 @@
 import discord
 from discord.ext import commands
-import os
+import asyncio
+import logging
+import time
 from pretty_help import PrettyHelp
-from typing import Union, Optional, List
+from typing import Dict, Union, Optional, List
+from util.discovery import discover_cogs
 
+logger = logging.getLogger(__name__)
 
-class Bot(commands.Bot):
+
+class Bot(commands.AutoShardedBot):
     def __init__(
         self,
         command_prefix: str,
         intents: discord.Intents = discord.Intents.all(),
         description: Union[str, None] = None,
         owner_ids: Optional[List[int]] = [],
+        shard_count: Optional[int] = None,
+        shard_ids: Optional[List[int]] = None,
+        lazy_cogs: Optional[List[str]] = [],
     ) -> None:
         """
         Initialize the bot.
@@ -24,39 +32,98 @@ class Bot(commands.Bot):
                 purposes when the tester may not be the creator of the bot. By passing in your
                 user id as an item in owner_ids, commands that require you to be a guild owner
                 or a bot owner will work.
+            - shard_count: Optional[int] - the total number of shards across every process, or None
+                to use the number Discord recommends
+            - shard_ids: Optional[List[int]] - the shards this process runs, or None to run all of them.
+                Requires `shard_count`.
+            - lazy_cogs: Optional[List[str]] - cogs that aren't loaded at startup, but the first time
+                someone uses a command that doesn't exist yet. This suits heavy cogs that are rarely used.
         """
         super().__init__(
             command_prefix,
             description=description,
             intents=intents,
             case_insensitive=True,
+            shard_count=shard_count,
+            shard_ids=shard_ids,
         )
         self.help_command = PrettyHelp(color=discord.Color.dark_purple())
         if len(owner_ids) > 0:
             self.owner_ids = owner_ids
+        self.lazy_cogs = list(lazy_cogs)
+        # seconds each cog's module spent adding its cogs, for the report in `load_cogs`
+        self.setup_times: Dict[str, float] = {}
+        # set once the bot starts shutting down, so cogs unloaded from then on know they aren't being reloaded
+        self.closing = False
 
-    async def load_cogs(self):
-        """
-        Load all cogs in the cogs directory
+    async def load_cogs(self, cogs: List[str]):
         """
-        cogs = os.listdir("cogs")
-        if "__pycache__" in cogs:
-            cogs.remove("__pycache__")  # ignore __pycache__
+        Load cogs by name, such as `monitor` for `cogs/monitor.py`, logging how long each took.
 
-        print("loading cogs: ", " ".join(cogs))
+        The extensions are loaded concurrently. Importing a cog's module blocks the event loop,
+        but adding its cogs, which is where they open databases and servers, overlaps with the
+        other cogs. The time a cog spent adding its cogs is reported as its setup, and the rest
+        of its load, mostly running its module and importing what it depends on, as its import.
 
-        # add the cogs
-        for cog in cogs:
-            cog = cog.strip(".py")
+        Arguments:
+            - cogs: List[str] - the cogs to load
+        """
+        print("loading cogs: ", " ".join(cogs))
 
-            # load the cog
+        async def load(cog: str) -> float:
+            start = time.perf_counter()
             await self.load_extension(f"cogs.{cog}")
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_times = await asyncio.gather(*(load(cog) for cog in cogs))
+        elapsed = time.perf_counter() - start
 
+        for cog, load_time in zip(cogs, load_times):
+            setup_time = self.setup_times.pop(f"cogs.{cog}", 0.0)
+            logger.info(
+                "Loaded cog %s in %.1f ms: import %.1f ms, setup %.1f ms",
+                cog,
+                load_time * 1000,
+                (load_time - setup_time) * 1000,
+                setup_time * 1000,
+            )
+        logger.info("Loaded %d cogs in %.1f ms", len(cogs), elapsed * 1000)
         print("all cogs loaded")
 
+    async def add_cog(self, cog: commands.Cog, **kwargs) -> None:
+        start = time.perf_counter()
+        try:
+            await super().add_cog(cog, **kwargs)
+        finally:
+            module = type(cog).__module__
+            self.setup_times[module] = (
+                self.setup_times.get(module, 0.0) + time.perf_counter() - start
+            )
+
+    async def load_lazy_cogs(self) -> bool:
+        """
+        Load the lazy cogs that haven't been loaded yet, returning whether there were any
+        """
+        cogs = [cog for cog in self.lazy_cogs if f"cogs.{cog}" not in self.extensions]
+        self.lazy_cogs = []
+        if len(cogs) == 0:
+            return False
+        await self.load_cogs(cogs)
+        return True
+
+    async def setup_hook(self):
+        # load the cogs once, before connecting, rather than on every reconnect
+        await self.load_cogs(
+            [cog for cog in discover_cogs() if cog not in self.lazy_cogs]
+        )
+
+    async def close(self) -> None:
+        self.closing = True
+        await super().close()
+
     async def on_connect(self):
         print("connected!")
-        await self.load_cogs()
 
     async def on_ready(self):
         await self.change_presence(activity=discord.Game(name="acmsjsu.org"))
@@ -65,4 +132,8 @@ class Bot(commands.Bot):
     async def on_command_error(
         self, ctx: commands.Context, exception: commands.CommandError
     ) -> None:
+        # the command may be in a lazy cog, so load them and try again
+        if isinstance(exception, commands.CommandNotFound) and await self.load_lazy_cogs():
+            await self.process_commands(ctx.message)
+            return
         await ctx.send(exception)
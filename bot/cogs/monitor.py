@@ -1,22 +1,83 @@
 from discord.ext import commands, tasks
 import discord
-from typing import Union, Mapping, Tuple, Optional, List
-from collections import deque
+from typing import Union, Tuple, Optional, List, Dict
 from datetime import datetime
 from util.checks import is_guild_owner
 from util.page import PageView
+from util.tail import tail, parse_time, chunk_lines
+from util.frames import FrameParser
+from util.history import History, HistoryPoint
+from util.history_store import HistoryStore
+from util.link_store import LinkStore
+from util.status_api import StatusAPI
+from util.perf import registry
+from util.lru import LRUCache
+from util.fanout import FanOut
+from util.assets import AssetCache
+from util.occupancy import Occupancy, WEEKDAYS
+from util.shared_status import SharedStatusReader
 import dotenv
 from datetime import datetime
 import asyncio
-from dataclasses import dataclass
 import textwrap
+import io
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+announce_time = registry.histogram(
+    "bot_announcement_seconds",
+    "How long announcing the door status took, across every guild",
+)
+receive_time = registry.histogram(
+    "bot_data_received_seconds",
+    "How long handling a chunk of the stream from the monitor took",
+)
+
+# after announcing a change, further changes within this many seconds are announced together
+ANNOUNCE_COALESCE = 0.5
+
+# more log lines than fit in this many messages are sent as a file instead
+MAX_LOG_MESSAGES = 3
+
+# rendered `-history` pages to keep, across every user paging through the history
+PAGE_CACHE_SIZE = 64
+
+# announcement edits to run at once, across every guild
+ANNOUNCE_CONCURRENCY = 8
+
+LOGO = "logo.png"
+
+# seconds a reloaded Monitor cog has to take over the state of the one it replaces,
+# after which the state is closed, since the cog was removed rather than reloaded
+HANDOFF_TIMEOUT = 10
+
+DEFAULT_HISTORY_DB = os.path.join(os.path.dirname(__file__), "..", "history.db")
 
 
 class DataHandler:
-    def __init__(self) -> None:
+    def __init__(self, sensor: Optional[str] = None) -> None:
+        """
+        Initialize the data handler
+
+        Arguments:
+            - sensor: Optional[str] - the id of the sensor whose door is announced, when
+                the monitor has several sensors. If None, the first sensor to send an update is announced.
+        """
         self.__cur_val = False
-        self.data_changed = True
+        self.__received = False
         self.update_timestamp = self.timestamp()
+        # door changes that haven't been added to the history yet
+        self.transitions: List[HistoryPoint] = []
+        # set whenever there are new transitions, so they can be announced right away
+        self.changed = asyncio.Event()
+        self.sensor = sensor
+        self.__sensor_chosen = sensor is not None
+        # the latest state of every sensor that has sent an update
+        self.sensors: Dict[Optional[str], bool] = {}
+        self.malformed_frames = 0
 
     @property
     def data(self) -> bool:
@@ -24,7 +85,33 @@ class DataHandler:
 
     @data.setter
     def data(self, val) -> None:
-        self.data_changed = val != self.__cur_val
+        self.update(val, self.timestamp().timestamp())
+
+    def update(
+        self, val: bool, sensor_timestamp: float, sensor: Optional[str] = None
+    ) -> None:
+        """
+        Update the door state
+
+        Arguments:
+            - val: bool - whether the door is open
+            - sensor_timestamp: float - the seconds since the epoch when the monitor read the
+                door. For updates that were spooled during an outage, this is well in the past.
+            - sensor: Optional[str] - the id of the sensor that read the door, if the monitor has several
+        """
+        self.sensors[sensor] = val
+        if not self.__sensor_chosen:
+            # the monitor sends its sensors in the order of its `DOOR_SENSORS`, so this is the
+            # first of them, which is also the one sent to its HTTP endpoint. Following every
+            # sensor would record a fake change whenever two doors disagree.
+            self.sensor = sensor
+            self.__sensor_chosen = True
+        if sensor != self.sensor:
+            return
+        if val != self.__cur_val or not self.__received:
+            self.transitions.append(HistoryPoint(int(sensor_timestamp), val))
+            self.changed.set()
+        self.__received = True
         self.__cur_val = val
         self.update_timestamp = self.timestamp()
 
@@ -37,19 +124,35 @@ class Protocol(asyncio.Protocol):
     def __init__(self, dh: DataHandler) -> None:
         super().__init__()
         self.dh = dh
+        self.parser = FrameParser()
 
     def data_received(self, data: bytes) -> None:
         """
-        The data received from the connection should be utf8 bytes
-        that decode to either "True" or "False"
+        The data received from the connection should be a stream of
+        newline terminated utf8 JSON records, each of the form
+        `{"seq": int, "ts": float, "open": bool}`, plus `"sensor": str` when the
+        monitor has several sensors. See `FrameParser` for the details.
         """
-        self.dh.data = data.decode() == "True"
+        start = time.perf_counter()
+        malformed = self.parser.malformed
+        for frame in self.parser.feed(data):
+            self.dh.update(frame.is_open, frame.timestamp, frame.sensor)
+        self.dh.malformed_frames += self.parser.malformed - malformed
+        receive_time.observe(time.perf_counter() - start)
+
 
+class ProtocolFactory:
+    """
+    Creates the Protocol for each connection from the monitor. The server keeps
+    the same factory through reloads of the Monitor cog, which point it at the
+    newest cog, so new connections use the newest code.
+    """
 
-@dataclass
-class HistoryPoint:
-    timestamp: int  # the integer value of the seconds since the epoch
-    is_open: bool  # whether the door was open at this time
+    def __init__(self, monitor: "Monitor") -> None:
+        self.monitor = monitor
+
+    def __call__(self) -> asyncio.Protocol:
+        return self.monitor.create_protocol()
 
 
 class Monitor(commands.Cog):
@@ -63,33 +166,62 @@ class Monitor(commands.Cog):
     def __init__(
         self,
         bot: commands.Bot,
-        update_freq: Optional[int] = 60,
+        update_freq: Optional[int] = 300,
         num_per_page: Optional[int] = 10,
         max_history_len: Optional[int] = 1000,
+        history_db: Optional[str] = None,
+        links_db: Optional[str] = None,
+        status_api: Optional[Tuple[str, int]] = None,
     ) -> None:
         """
         Initialize the Monitor cog
 
         Arguments:
             - bot: commands.Bot - the bot that owns this cog
-            - update_freq: Optional[int] - how often to update the status of the door, in seconds
+            - update_freq: Optional[int] - how often to refresh the announcements, in seconds.
+                Door changes are announced as they arrive, so this only catches up messages
+                whose edits failed.
             - num_per_page: Optional[int] - the number of history entries to show per page
-            - max_history_len: Optional[int] - the total number of history entries to store
+            - max_history_len: Optional[int] - the number of the newest history entries to keep in memory
+            - history_db: Optional[str] - the SQLite database to persist the whole history to.
+                If None, the history is only kept in memory, and is limited to `max_history_len` entries.
+            - links_db: Optional[str] - the SQLite database to persist the linked announcement messages to.
+                If None, every guild has to link again after a restart.
+            - status_api: Optional[Tuple[str, int]] - the host and port to serve the door status and history
+                over HTTP on. If None, they aren't served.
         """
         super().__init__()
         self.bot = bot
 
         # maps from the guild id to the message that was sent
-        self.messages: Mapping[int, discord.Message] = {}
+        # the messages of guilds loaded from the link store are `discord.PartialMessage`s
+        self.messages: Dict[int, Union[discord.Message, discord.PartialMessage]] = {}
+        self.links = LinkStore(links_db) if links_db is not None else None
+        self.fanout = FanOut(ANNOUNCE_CONCURRENCY)
 
         self.update_freq = update_freq
         self.num_per_page = num_per_page
         self.max_history_len = max_history_len
 
-        self.history: List[HistoryPoint] = []
+        # the newest part of the history; older pages are read from the store
+        self.history = History(self.max_history_len)
+        self.store = HistoryStore(history_db) if history_db is not None else None
+        # rendered history lines, by position in the whole history, which never change
+        self.line_cache = LRUCache(self.max_history_len)
+        # rendered pages, by (history version, page, page size)
+        self.page_cache = LRUCache(PAGE_CACHE_SIZE)
+        # rollups over the whole history, for `-stats`
+        self.occupancy = Occupancy()
         self.to_str = {True: "Open", False: "Closed"}
         self.emojis = {True: ":unlock:", False: ":lock:"}
 
+        self.assets = AssetCache(os.path.join(os.path.dirname(__file__), ".."))
+        # announcements only fill in the timestamp of these
+        self.status_templates = {
+            door_open: self.create_status_template(door_open)
+            for door_open in (True, False)
+        }
+
         self.task = tasks.Loop(
             self.send_announcement,
             seconds=self.update_freq,
@@ -99,31 +231,151 @@ class Monitor(commands.Cog):
             count=None,
             reconnect=True,
         )
-        self.server: asyncio.Server = None
-        self.data_handler = DataHandler()
+        self.status_api = (
+            StatusAPI(
+                self.door_status,
+                self.get_points,
+                self.history_len,
+                self.get_between,
+                *status_api,
+            )
+            if status_api is not None
+            else None
+        )
+        self.announcer: Optional[asyncio.Task] = None
+        # an asyncio.Server, or a SharedStatusReader for the shared memory transport
+        self.server: Optional[Union[asyncio.Server, SharedStatusReader]] = None
+        self.protocol_factory = ProtocolFactory(self)
+        self.data_handler = DataHandler(dotenv.dotenv_values().get("DOOR_SENSOR"))
 
-    async def create_status_embed(
-        self, door_open: bool
-    ) -> Tuple[discord.Embed, discord.File]:
+    async def cog_load(self) -> None:
         """
-        Create the status embed to display the door status
+        Load the logo and the linked messages of the guilds this shard owns, open the history store,
+        load the occupancy rollups and the newest part of the history into memory
+        and start serving the status API.
+        On a reload, all of that is taken over from the cog being replaced instead.
+        """
+        await asyncio.to_thread(self.assets.load, LOGO)
+        handoff = getattr(self.bot, "monitor_handoff", None)
+        if handoff is not None:
+            self.claim(handoff)
+            return
+
+        if self.links is not None:
+            await self.links.open()
+            # the messages are only fetched when they're edited
+            for guild_id, channel_id, message_id in await self.links.links():
+                if self.owns_guild(guild_id):
+                    channel = self.bot.get_partial_messageable(
+                        channel_id, guild_id=guild_id
+                    )
+                    self.messages[guild_id] = channel.get_partial_message(message_id)
+        if self.store is not None:
+            await self.store.open()
+            await self.store.load_occupancy(self.occupancy)
+            self.history.extend(await self.store.tail(self.max_history_len))
+        if self.status_api is not None:
+            await self.status_api.start()
+
+    def claim(self, handoff: dict) -> None:
+        """
+        Take over the server, the door state, the history and the linked messages from the
+        cog this one replaces, and carry on announcing if it was. The stores and the status API
+        are taken over too, so configuration changes to them need a restart.
+
+        Arguments:
+            - handoff: dict - the state the replaced cog left on the bot in `cog_unload`
+        """
+        self.bot.monitor_handoff = None
+        handoff["timer"].cancel()
+
+        self.server = handoff["server"]
+        self.protocol_factory = handoff["protocol_factory"]
+        self.protocol_factory.monitor = self
+        self.data_handler = handoff["data_handler"]
+        self.history = handoff["history"]
+        self.occupancy = handoff["occupancy"]
+        self.store = handoff["store"]
+        self.links = handoff["links"]
+        self.messages = handoff["messages"]
+        self.fanout = handoff["fanout"]
+        self.status_api = handoff["status_api"]
+        if self.status_api is not None:
+            self.status_api.get_status = self.door_status
+            self.status_api.get_points = self.get_points
+            self.status_api.get_length = self.history_len
+            self.status_api.get_between = self.get_between
+
+        if handoff["running"]:
+            self.task.start()
+            self.announcer = asyncio.create_task(self.announce_changes())
+
+    def create_protocol(self) -> Protocol:
+        """
+        Create the Protocol for a new connection from the monitor
+        """
+        return Protocol(self.data_handler)
+
+    def door_status(self) -> Tuple[bool, Optional[int]]:
+        """
+        Return whether the door is open, and the seconds since the epoch when it last changed, if that's known
+        """
+        return self.data_handler.data, self.last_change()
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """
+        Return whether the guild is served by this process's shards, so its announcements are made here
+
+        Arguments:
+            - guild_id: int - the id of the guild
+        """
+        shard_count = self.bot.shard_count
+        if shard_count is None or shard_count <= 1:
+            return True
+        if isinstance(self.bot, commands.AutoShardedBot):
+            # without shard ids, an AutoShardedBot runs every shard
+            shard_ids = self.bot.shard_ids
+        else:
+            shard_ids = [self.bot.shard_id] if self.bot.shard_id is not None else None
+        return shard_ids is None or (guild_id >> 22) % shard_count in shard_ids
+
+    def history_len(self) -> int:
+        """
+        Return the number of entries in the whole history, including those only in the store
+        """
+        return self.store.count if self.store is not None else len(self.history)
+
+    def create_status_template(self, door_open: bool) -> discord.Embed:
+        """
+        Create the part of the status embed that only depends on whether the door is open
 
         Arguments:
             - door_open: bool - whether or not the door is open
         """
         embed = discord.Embed(title="CS Club Door Status")
-        file = discord.File(fp="logo.png", filename="logo.png")
-        embed.set_thumbnail(url="attachment://logo.png")
-        timestamp = f"<t:{int(datetime.now().timestamp())}>"
+        # the logo is attached to the message when it's linked, and stays through edits
+        embed.set_thumbnail(url=self.assets.url(LOGO))
+        embed.color = discord.Colour.green() if door_open else discord.Colour.red()
+        return embed
 
-        if door_open:
-            embed.color = discord.Colour.green()
-            embed.description = f"MQH 227 is now open - {timestamp}"
-        else:
-            embed.color = discord.Colour.red()
-            embed.description = f"MQH 227 is now closed - {timestamp}"
+    def create_status_embed(
+        self, door_open: bool, since: Optional[int] = None
+    ) -> discord.Embed:
+        """
+        Create the status embed to display the door status
 
-        return embed, file
+        Arguments:
+            - door_open: bool - whether or not the door is open
+            - since: Optional[int] - the seconds since the epoch when the door last opened or closed.
+                Defaults to now.
+        """
+        embed = self.status_templates[door_open].copy()
+        if since is None:
+            since = int(datetime.now().timestamp())
+        embed.description = (
+            f"MQH 227 is now {'open' if door_open else 'closed'} - <t:{since}>"
+        )
+        return embed
 
     async def send_announcement(self):
         """
@@ -132,20 +384,49 @@ class Monitor(commands.Cog):
         to. If the bot's door monitor isn't linked to a channel,
         nothing will happen.
         """
+        start = time.perf_counter()
         # get the door status
         door_open = self.data_handler.data
 
-        for guild in self.messages:
-            embed, _ = await self.create_status_embed(door_open)
-            self.messages[guild] = await self.messages[guild].edit(embed=embed)
-
-        if self.data_handler.data_changed:
-            self.data_handler.data_changed = False
-            self.history.append(
-                HistoryPoint(int(datetime.now().timestamp()), door_open)
-            )
-            if len(self.history) > self.max_history_len:
-                self.history = self.history[1:]
+        # record door changes with the time the monitor saw them, not the time we got them
+        if len(self.data_handler.transitions) > 0:
+            transitions = self.data_handler.transitions
+            self.data_handler.transitions = []
+            self.history.extend(transitions)
+            self.occupancy.extend(transitions)
+            if self.store is not None:
+                await self.store.append(transitions, self.occupancy)
+            if self.status_api is not None:
+                await self.status_api.refresh()
+
+        # the embed shows when the door last changed, so it only changes with the door
+        if len(self.messages) > 0:
+            embed = self.create_status_embed(door_open, self.last_change())
+            for guild in await self.fanout.announce(self.messages, embed):
+                if self.links is not None:
+                    await self.links.unlink(guild)
+        announce_time.observe(time.perf_counter() - start)
+
+    async def announce_changes(self) -> None:
+        """
+        Announce door changes as soon as they arrive. After each announcement, changes
+        are coalesced for `ANNOUNCE_COALESCE` seconds, so a door flapping open and
+        closed is announced a few times a second at most, showing its latest state.
+        """
+        while True:
+            await self.data_handler.changed.wait()
+            self.data_handler.changed.clear()
+            try:
+                await self.send_announcement()
+            except Exception:
+                logger.exception("Failed to announce a door change")
+            await asyncio.sleep(ANNOUNCE_COALESCE)
+
+    def last_change(self) -> Optional[int]:
+        """
+        Return the seconds since the epoch when the door last opened or closed, if it's known
+        """
+        return self.history[-1].timestamp if len(self.history) > 0 else None
 
     @commands.command(name="link")
     @commands.check_any(is_guild_owner(), commands.is_owner())
@@ -172,8 +453,15 @@ class Monitor(commands.Cog):
             else:
                 is_open = False
 
-            embed, file = await self.create_status_embed(is_open)
-            self.messages[ctx.guild.id] = await channel.send(embed=embed, file=file)
+            embed = self.create_status_embed(is_open, self.last_change())
+            self.messages[ctx.guild.id] = await channel.send(
+                embed=embed, file=self.assets.file(LOGO)
+            )
+            self.fanout.shows(ctx.guild.id, embed)
+            if self.links is not None:
+                await self.links.link(
+                    ctx.guild.id, channel.id, self.messages[ctx.guild.id].id
+                )
             await ctx.send(
                 f"Now using {channel.mention} as the place to send announcements"
             )
@@ -186,7 +474,7 @@ class Monitor(commands.Cog):
         """
         if ctx.guild.id in self.messages:
             await ctx.send(
-                f"Correctly linked to send door monitor announcements to {self.messages[ctx.guild.id].channel.mention}"
+                f"Correctly linked to send door monitor announcements to <#{self.messages[ctx.guild.id].channel.id}>"
             )
         else:
             await ctx.send(
@@ -201,17 +489,41 @@ class Monitor(commands.Cog):
         """
         if not self.task.is_running():
             self.task.start()
+        if self.announcer is None:
+            self.announcer = asyncio.create_task(self.announce_changes())
         if self.server is None:
-            loop = asyncio.get_event_loop()
-            self.server: asyncio.Server = await loop.create_server(
-                lambda: Protocol(self.data_handler),
-                "localhost",
-                int(dotenv.dotenv_values()["DOOR_PORT"]),
-            )
-            await self.server.start_serving()
+            self.server = await self.create_server()
 
         await ctx.send("Started monitoring door status.")
 
+    async def create_server(self) -> Union[asyncio.Server, SharedStatusReader]:
+        """
+        Start receiving door updates from the monitor over the transport set by `DOOR_TRANSPORT`:
+        `tcp` (the default) on `DOOR_PORT`, `unix` on the socket at `DOOR_SOCKET_PATH`, or `shm`
+        from the status block at `DOOR_SHM_PATH`, checked every `DOOR_SHM_POLL` seconds.
+        """
+        vals = dotenv.dotenv_values()
+        transport = vals.get("DOOR_TRANSPORT", "tcp").lower()
+        loop = asyncio.get_running_loop()
+        if transport == "tcp":
+            return await loop.create_server(
+                self.protocol_factory, "localhost", int(vals["DOOR_PORT"])
+            )
+        if transport == "unix":
+            # a socket left behind by a previous run is replaced
+            return await loop.create_unix_server(
+                self.protocol_factory, vals["DOOR_SOCKET_PATH"]
+            )
+        if transport == "shm":
+            reader = SharedStatusReader(
+                vals["DOOR_SHM_PATH"],
+                self.protocol_factory,
+                float(vals.get("DOOR_SHM_POLL", 0.01)),
+            )
+            await reader.start()
+            return reader
+        raise ValueError(f"DOOR_TRANSPORT must be tcp, unix or shm, not {transport}")
+
     async def _stop(self):
         """
         Stop all door announcement messages.
@@ -220,6 +532,9 @@ class Monitor(commands.Cog):
             self.server.close()
             await self.server.wait_closed()
             self.server = None
+        if self.announcer is not None:
+            self.announcer.cancel()
+            self.announcer = None
         self.task.stop()
 
     @commands.command(name="stop")
@@ -232,32 +547,97 @@ class Monitor(commands.Cog):
         await self._stop()
         await ctx.send("Stopped monitoring door status.")
 
+    async def get_points(self, start: int, end: int) -> List[HistoryPoint]:
+        """
+        Return the history points from position `start` up to but not including `end`, oldest first
+
+        Arguments:
+            - start: int - the position of the first point, where 0 is the oldest entry
+            - end: int - the position after the last point
+        """
+        # the memory only holds the newest entries, so older ones come from the store
+        in_memory = self.history_len() - len(self.history)
+        if start >= in_memory:
+            return self.history[start - in_memory : end - in_memory]
+        return await self.store.fetch(start, end)
+
+    async def get_between(self, since: int, until: int, limit: int) -> List[HistoryPoint]:
+        """
+        Return up to `limit` history points with timestamps from `since` up to but not including `until`,
+        oldest first. Without a store, only the points in memory are searched.
+
+        Arguments:
+            - since: int - the seconds since the epoch to start from
+            - until: int - the seconds since the epoch to end at
+            - limit: int - the most points to return
+        """
+        if self.store is not None:
+            return await self.store.between(since, until, limit)
+        return [point for point in self.history if since <= point.timestamp < until][
+            :limit
+        ]
+
+    async def get_lines(self, start: int, end: int) -> List[str]:
+        """
+        Return the rendered history lines from position `start` up to but not including `end`,
+        oldest first. Only lines that aren't cached yet are rendered.
+
+        Arguments:
+            - start: int - the position of the first line, where 0 is the oldest entry
+            - end: int - the position after the last line
+        """
+        # without a store, evicted points shift every position, so cache by points ever appended
+        offset = (
+            0 if self.store is not None else self.history.appended - len(self.history)
+        )
+        lines = [self.line_cache.get(offset + i) for i in range(start, end)]
+        missing = [i for i, line in enumerate(lines) if line is None]
+        if len(missing) > 0:
+            first, last = start + missing[0], start + missing[-1] + 1
+            for position, point in enumerate(
+                await self.get_points(first, last), start=first
+            ):
+                line = f"{self.emojis[point.is_open]} {self.to_str[point.is_open]} - <t:{point.timestamp}>\n"
+                self.line_cache[offset + position] = line
+                lines[position - start] = line
+        return lines
+
     async def get_page(self, page: int):
         """
-        Get the embed that displays the `page` page of the history
+        Get the embed that displays the `page` page of the history.
+        Embeds are cached and shared, so they must not be modified.
 
         Arguments:
             - page: int - the page (0 indexed) to display the history for
         """
+        # every new point changes the version, shifting every page by one
+        key = (self.history.appended, page, self.num_per_page)
+        embed = self.page_cache.get(key)
+        if embed is not None:
+            return embed
+
+        # positions in the whole history, where 0 is the oldest entry
+        total = self.history_len()
+        start = max(total - (page + 1) * self.num_per_page, 0)
+        end = max(total - page * self.num_per_page, 0)
+
+        lines = await self.get_lines(start, end)
         embed = discord.Embed(
-            title="Door History", description="", color=discord.Colour.blurple()
+            title="Door History",
+            description="".join(reversed(lines)),
+            color=discord.Colour.blurple(),
         )
-
-        start = -(page + 1) * self.num_per_page
-        end = -page * self.num_per_page if page != 0 else len(self.history)
-
-        for point in reversed(self.history[start:end]):
-            embed.description += f"{self.emojis[point.is_open]} {self.to_str[point.is_open]} - <t:{point.timestamp}>\n"
-
         embed.set_footer(text=f"Showing page {page+1}/{self.get_total_pages()}")
+        self.page_cache[key] = embed
         return embed
 
     def get_total_pages(self):
         """
         Return the total number of pages that the history command will have
         """
-        return len(self.history) // self.num_per_page + (
-            1 if (len(self.history) % self.num_per_page) != 0 else 0
+        total = self.history_len()
+        return total // self.num_per_page + (
+            1 if (total % self.num_per_page) != 0 else 0
         )
 
     @commands.command(name="history")
@@ -275,27 +655,126 @@ class Monitor(commands.Cog):
             ),
         )
 
+    @commands.command(name="stats")
+    async def stats(self, ctx: commands.Context):
+        """
+        Get how long the door has been open by day, week and
+        hour of the week, and the longest it was left open.
+
+        Example:
+        -stats
+        """
+        now = datetime.now().timestamp()
+        occupancy = self.occupancy
+        embed = discord.Embed(title="Door Stats", color=discord.Colour.blurple())
+
+        embed.add_field(
+            name="Last 7 days",
+            value="\n".join(
+                f"{WEEKDAYS[day.weekday()]} {day:%m/%d}: {seconds / 3600:.1f} h"
+                for day, seconds in occupancy.days(now)
+            ),
+        )
+        embed.add_field(
+            name="Last 4 weeks",
+            value="\n".join(
+                f"Week {week}, {year}: {seconds / 3600:.1f} h"
+                for (year, week), seconds in occupancy.weeks(now)
+            ),
+        )
+        busiest = occupancy.busiest_hours()
+        if len(busiest) > 0:
+            embed.add_field(
+                name="Busiest hours",
+                value="\n".join(
+                    f"{WEEKDAYS[weekday]} {hour:02}:00: {seconds / 3600:.1f} h in total"
+                    for weekday, hour, seconds in busiest
+                ),
+                inline=False,
+            )
+        streaks = occupancy.longest_streaks()
+        if len(streaks) > 0:
+            embed.add_field(
+                name="Longest open",
+                value="\n".join(
+                    f"{seconds / 3600:.1f} h from <t:{int(start)}>"
+                    for seconds, start in streaks
+                ),
+                inline=False,
+            )
+        if occupancy.average_open is not None:
+            embed.add_field(
+                name="Average time open",
+                value=f"{occupancy.average_open / 60:.0f} min over {occupancy.open_count} openings",
+                inline=False,
+            )
+
+        # the heatmap is only available when numpy is installed
+        heatmap = occupancy.heatmap()
+        if heatmap is None:
+            await ctx.send(embed=embed)
+            return
+        embed.set_image(url="attachment://heatmap.png")
+        embed.set_footer(text="Hours of the week the door was open, Monday at the top")
+        await ctx.send(
+            embed=embed, file=discord.File(io.BytesIO(heatmap), filename="heatmap.png")
+        )
+
     @commands.command(name="logs")
     @commands.is_owner()
-    async def get_logs(self, ctx: commands.Context, lines: int):
+    async def get_logs(
+        self,
+        ctx: commands.Context,
+        lines: int,
+        level: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+    ):
         """
-        Get the last `lines` lines from the log file
+        Get the last `lines` lines from the log file, optionally only
+        those at or above a level, or between two times. Times are either
+        ISO timestamps or durations ago, such as 30m, 2h or 1d.
 
         Examples:
         -logs 5
         -logs 10
+        -logs 20 warning
+        -logs 50 all 2h 1h
         """
-        cur = deque()
+        if level is None or level.lower() == "all":
+            min_level = None
+        else:
+            min_level = logging.getLevelName(level.upper())
+            if not isinstance(min_level, int):
+                await ctx.send(f"Sorry, {level} isn't a log level.")
+                return
+
+        times = []
+        for value in (since, until):
+            try:
+                times.append(parse_time(value))
+            except ValueError:
+                await ctx.send(f"Sorry, {value} isn't a valid time.")
+                return
+
         vals = dotenv.dotenv_values()
-        with open(vals["MONITOR_LOG_LOCATION"]) as f:
-            line = f.readline()
-            while len(line) != 0:
-                cur.append(line)
-                if len(cur) > lines:
-                    cur.popleft()
-                line = f.readline()
-        joined = "".join(cur)
-        await ctx.send(f"```\n{joined}\n```")
+        found = await asyncio.to_thread(
+            tail, vals["MONITOR_LOG_LOCATION"], lines, min_level, *times
+        )
+        if len(found) == 0:
+            await ctx.send("No matching log lines.")
+            return
+
+        # discord messages are limited to 2000 characters, including the code block
+        chunks = chunk_lines(found, 2000 - len("```\n\n```"))
+        if len(chunks) <= MAX_LOG_MESSAGES:
+            for chunk in chunks:
+                await ctx.send(f"```\n{chunk}\n```")
+        else:
+            file = discord.File(
+                io.BytesIO("\n".join(found).encode()), filename="monitor.log"
+            )
+            await ctx.send(f"Last {len(found)} lines of the log:", file=file)
 
     @commands.command(name="status")
     async def status(self, ctx: commands.Context):
@@ -331,14 +810,94 @@ class Monitor(commands.Cog):
             * Still receiving monitor messages: {still_receiving}
             """
         )
+        if ctx.guild.id in self.fanout.latency:
+            embed.description += f"* Last announcement edit took: {self.fanout.latency[ctx.guild.id] * 1000:.0f} ms\n"
+        if self.data_handler.malformed_frames > 0:
+            embed.description += (
+                f"* Malformed monitor messages: {self.data_handler.malformed_frames}\n"
+            )
+        sensors = {
+            sensor: is_open
+            for sensor, is_open in self.data_handler.sensors.items()
+            if sensor is not None
+        }
+        if len(sensors) > 0:
+            embed.description += "* Sensors:\n"
+            embed.description += "\n".join(
+                f"  * {sensor}: {self.to_str[is_open]}"
+                + (" (announced)" if sensor == self.data_handler.sensor else "")
+                for sensor, is_open in sensors.items()
+            )
         await ctx.send(embed=embed)
 
     async def cog_unload(self) -> None:
         """
-        Cleanup by stopping all tasks before unloading
+        Stop announcing, and leave the server, the door state, the history and the linked
+        messages on the bot for the cog that replaces this one on a reload. The server keeps
+        listening meanwhile, so no door updates are lost. If no cog claims them within
+        `HANDOFF_TIMEOUT` seconds, this cog was removed, so they're closed.
+        When the bot is shutting down, nothing will claim them, so they're closed right away.
+        """
+        running = self.task.is_running()
+        # stopping would still run one more iteration after the sleep, on this cog
+        self.task.cancel()
+        if self.announcer is not None:
+            self.announcer.cancel()
+            self.announcer = None
+        if getattr(self.bot, "closing", False):
+            await self._close()
+            return
+
+        handoff = {
+            "running": running,
+            "server": self.server,
+            "protocol_factory": self.protocol_factory,
+            "data_handler": self.data_handler,
+            "history": self.history,
+            "occupancy": self.occupancy,
+            "store": self.store,
+            "links": self.links,
+            "messages": self.messages,
+            "fanout": self.fanout,
+            "status_api": self.status_api,
+        }
+        handoff["timer"] = asyncio.get_running_loop().call_later(
+            HANDOFF_TIMEOUT, lambda: asyncio.create_task(self._release(handoff))
+        )
+        self.bot.monitor_handoff = handoff
+
+    async def _release(self, handoff: dict) -> None:
+        """
+        Close everything that was left for a cog that never claimed it
+        """
+        if getattr(self.bot, "monitor_handoff", None) is not handoff:
+            return
+        self.bot.monitor_handoff = None
+        await self._close()
+
+    async def _close(self) -> None:
+        """
+        Stop all tasks and close the server, the status API and the stores
         """
         await self._stop()
+        if self.status_api is not None:
+            await self.status_api.close()
+        if self.store is not None:
+            await self.store.close()
+        if self.links is not None:
+            await self.links.close()
 
 
 async def setup(bot: commands.Bot):
-    await bot.add_cog(Monitor(bot))
+    vals = dotenv.dotenv_values()
+    # the history and the links share a database
+    db = vals.get("HISTORY_DB", DEFAULT_HISTORY_DB)
+    status_api = None
+    if vals.get("STATUS_API_PORT"):
+        status_api = (
+            vals.get("STATUS_API_HOST", "localhost"),
+            int(vals["STATUS_API_PORT"]),
+        )
+    await bot.add_cog(
+        Monitor(bot, history_db=db, links_db=db, status_api=status_api)
+    )
@@ -0,0 +1,170 @@
+from discord.ext import commands
+import discord
+from typing import Optional
+from util.perf import (
+    registry,
+    command_time,
+    rate_limits,
+    RateLimitCounter,
+    Histogram,
+    instrument_http,
+    uninstrument_http,
+    sample_loop_lag,
+)
+import dotenv
+import asyncio
+import io
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# the most label values to list for each metric in `-perf`
+MAX_PERF_LINES = 8
+
+
+class Perf(commands.Cog):
+    """
+    Performance metrics of the bot
+    """
+
+    def __init__(
+        self,
+        bot: commands.Bot,
+        metrics_file: Optional[str] = None,
+        metrics_every: float = 60,
+    ) -> None:
+        """
+        Initialize the Perf cog
+
+        Arguments:
+            - bot: commands.Bot - the bot that owns this cog
+            - metrics_file: Optional[str] - a file to write the metrics to, in the Prometheus
+                text format, so they can be tracked over time. If None, they aren't written.
+            - metrics_every: float - how often to write the metrics file, in seconds
+        """
+        super().__init__()
+        self.bot = bot
+        self.metrics_file = metrics_file
+        self.metrics_every = metrics_every
+        self.rate_limit_counter = RateLimitCounter()
+        self.tasks = []
+
+    async def cog_load(self) -> None:
+        """
+        Start timing Discord requests, counting rate limits and sampling event loop lag
+        """
+        instrument_http(self.bot.http)
+        logging.getLogger("discord.http").addHandler(self.rate_limit_counter)
+        self.tasks.append(asyncio.create_task(sample_loop_lag()))
+        if self.metrics_file is not None:
+            self.tasks.append(asyncio.create_task(self.write_metrics()))
+
+    async def cog_unload(self) -> None:
+        """
+        Stop instrumenting the bot before unloading
+        """
+        uninstrument_http(self.bot.http)
+        logging.getLogger("discord.http").removeHandler(self.rate_limit_counter)
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    def _write(self, text: str) -> None:
+        # renamed over the previous file, so a scrape in the middle of a write gets the previous metrics
+        with open(self.metrics_file + ".tmp", "w") as f:
+            f.write(text)
+        os.replace(self.metrics_file + ".tmp", self.metrics_file)
+
+    async def write_metrics(self) -> None:
+        """
+        Write the metrics to the metrics file every `metrics_every` seconds
+        """
+        while True:
+            await asyncio.sleep(self.metrics_every)
+            try:
+                await asyncio.to_thread(self._write, registry.render())
+            except OSError:
+                logger.exception("Failed to write metrics to %s", self.metrics_file)
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx: commands.Context) -> None:
+        ctx.perf_start = time.perf_counter()
+
+    def observe_command(self, ctx: commands.Context) -> None:
+        start = getattr(ctx, "perf_start", None)
+        if start is not None and ctx.command is not None:
+            command_time(ctx.command.qualified_name).observe(
+                time.perf_counter() - start
+            )
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context) -> None:
+        self.observe_command(ctx)
+
+    @commands.Cog.listener()
+    async def on_command_error(
+        self, ctx: commands.Context, exception: commands.CommandError
+    ) -> None:
+        self.observe_command(ctx)
+
+    @commands.command(name="perf")
+    @commands.is_owner()
+    async def perf(self, ctx: commands.Context, export: Optional[str] = None):
+        """
+        Summarize how long commands, announcements and Discord requests take,
+        how far the event loop lags, and how often Discord rate limits the bot
+
+        Examples:
+            `-perf` - summarize the metrics
+            `-perf export` - also attach every metric in the Prometheus text format
+
+        Arguments:
+            export - `export` to attach the metrics as a file
+        """
+        embed = discord.Embed(title="Bot Performance", color=discord.Colour.blurple())
+        embed.description = (
+            f"* Gateway latency: {self.bot.latency * 1000:.0f} ms\n"
+            f"* Rate limits hit: {rate_limits.value}\n"
+        )
+
+        # one field per histogram, with a line per label
+        fields = {}
+        for metric in registry.metrics.values():
+            if isinstance(metric, Histogram) and metric.count > 0:
+                fields.setdefault(metric.help, []).append(metric)
+        for help, metrics in fields.items():
+            metrics.sort(key=lambda metric: metric.count, reverse=True)
+            embed.add_field(
+                name=help,
+                value="\n".join(
+                    f"{metric.labels[1:-1] or 'all'}: {metric.count}x, "
+                    f"p50 {metric.quantile(0.5) * 1000:.1f} ms, "
+                    f"p99 {metric.quantile(0.99) * 1000:.1f} ms, "
+                    f"max {metric.max * 1000:.1f} ms"
+                    for metric in metrics[:MAX_PERF_LINES]
+                ),
+                inline=False,
+            )
+
+        if export is None:
+            await ctx.send(embed=embed)
+        elif export.lower() == "export":
+            file = discord.File(
+                io.BytesIO(registry.render().encode()), filename="metrics.prom"
+            )
+            await ctx.send(embed=embed, file=file)
+        else:
+            await ctx.send(f"Unknown option {export}, did you mean `export`?")
+
+
+async def setup(bot: commands.Bot):
+    vals = dotenv.dotenv_values()
+    await bot.add_cog(
+        Perf(
+            bot,
+            metrics_file=vals.get("BOT_METRICS_FILE"),
+            metrics_every=float(vals.get("BOT_METRICS_EVERY", 60)),
+        )
+    )
@@ -1,6 +1,7 @@
 from discord.ext import commands
 import discord
 import os
+from util.discovery import discover_cogs
 
 
 class Util(commands.Cog):
@@ -37,9 +38,7 @@ class Util(commands.Cog):
         errors = []
 
         if cogs[0] == "all":
-            cogs = [
-                cog.strip(".py") for cog in os.listdir("cogs") if cog != "__pycache__"
-            ]
+            cogs = discover_cogs()
 
         async with ctx.typing():
             for cog in cogs:
@@ -98,9 +97,7 @@ class Util(commands.Cog):
         errors = []
 
         if cogs[0] == "all":
-            cogs = [
-                cog.strip(".py") for cog in os.listdir("cogs") if cog != "__pycache__"
-            ]
+            cogs = discover_cogs()
 
         async with ctx.typing():
             for cog in cogs:
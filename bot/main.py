@@ -3,8 +3,18 @@ from dotenv import dotenv_values
 
 
 if __name__ == "__main__":
+    vals = dotenv_values()
+    shard_count = vals.get("SHARD_COUNT")
+    shard_ids = vals.get("SHARD_IDS")
+    lazy_cogs = vals.get("LAZY_COGS")
+
     # Owners: Elliot, Kevin, Trique
     bot = Bot(
-        "-", owner_ids=[722118273784610857, 956269409805144084, 633467510833807370]
+        "-",
+        owner_ids=[722118273784610857, 956269409805144084, 633467510833807370],
+        shard_count=int(shard_count) if shard_count else None,
+        shard_ids=[int(i) for i in shard_ids.split(",")] if shard_ids else None,
+        lazy_cogs=[cog.strip() for cog in lazy_cogs.split(",")] if lazy_cogs else [],
     )
-    bot.run(dotenv_values()["BOT_TOKEN"])
+    # log to stderr through the root logger, so the bot's own logs, like the cog load times, show up too
+    bot.run(vals["BOT_TOKEN"], root_logger=True)
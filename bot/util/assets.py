@@ -0,0 +1,55 @@
+import io
+import os
+from typing import Dict
+
+import discord
+
+
+class AssetCache:
+    """
+    Keeps the files the bot attaches to messages in memory, so they are read
+    from disk once instead of every time they are sent.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Create an empty cache
+
+        Arguments:
+            - directory: str - the directory the assets are in
+        """
+        self.directory = directory
+        self.assets: Dict[str, bytes] = {}
+
+    def load(self, name: str) -> bytes:
+        """
+        Return the contents of the asset, reading it from disk if it isn't cached yet
+
+        Arguments:
+            - name: str - the file name of the asset
+        """
+        data = self.assets.get(name)
+        if data is None:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = self.assets[name] = f.read()
+        return data
+
+    def file(self, name: str) -> discord.File:
+        """
+        Return the asset as a file to attach to a message.
+        Files can only be sent once, so a new one is made each call.
+
+        Arguments:
+            - name: str - the file name of the asset
+        """
+        return discord.File(io.BytesIO(self.load(name)), filename=name)
+
+    @staticmethod
+    def url(name: str) -> str:
+        """
+        Return the URL an embed uses to show the asset attached to its message
+
+        Arguments:
+            - name: str - the file name of the asset
+        """
+        return f"attachment://{name}"
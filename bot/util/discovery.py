@@ -0,0 +1,17 @@
+import os
+import pkgutil
+from typing import List
+
+# the cogs live next to the bot, wherever it's run from
+COGS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cogs")
+
+
+def discover_cogs() -> List[str]:
+    """
+    Return the name of every cog in the cogs directory, such as `monitor` for `cogs/monitor.py`
+    """
+    return sorted(
+        module.name
+        for module in pkgutil.iter_modules([COGS_DIR])
+        if not module.ispkg
+    )
@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import time
+import weakref
+from typing import Dict, List, MutableMapping
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+class FanOut:
+    """
+    Edits the announcement message of every guild to show the same embed.
+
+    Messages that already show the embed are skipped, so edits only happen when
+    the rendered content changes. Edits run concurrently, up to `concurrency` at
+    a time, but never more than one per channel: edits to a channel share a
+    Discord rate limit bucket, so a second one would only wait in discord.py's
+    rate limiter while holding a slot. If an edit is superseded by a newer embed
+    while it waits, it is dropped.
+    """
+
+    def __init__(self, concurrency: int = 8) -> None:
+        """
+        Create the scheduler
+
+        Arguments:
+            - concurrency: int - the most edits to run at once
+        """
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # a lock is only kept while an edit holds it or waits on it, so unlinked channels don't pile up
+        self.channel_locks: MutableMapping[int, asyncio.Lock] = weakref.WeakValueDictionary()
+        self.shown: Dict[int, str] = {}  # the content each guild's message shows
+        self.wanted: Dict[int, str] = {}  # the content each guild's message should show
+        self.latency: Dict[int, float] = {}  # the last edit latency of each guild, in seconds
+
+        # stats
+        self.edited = 0
+        self.skipped = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    @staticmethod
+    def digest(embed: discord.Embed) -> str:
+        """
+        Return a key that is equal for embeds that render the same
+        """
+        return json.dumps(embed.to_dict(), sort_keys=True)
+
+    def shows(self, guild: int, embed: discord.Embed) -> None:
+        """
+        Record that the guild's message was just sent with `embed`, so it isn't edited to show it again
+
+        Arguments:
+            - guild: int - the id of the guild the message is in
+            - embed: discord.Embed - the embed the message shows
+        """
+        self.shown[guild] = self.wanted[guild] = self.digest(embed)
+
+    async def announce(
+        self, messages: MutableMapping[int, discord.Message], embed: discord.Embed
+    ) -> List[int]:
+        """
+        Edit every message to show `embed`, skipping those that already show it.
+        `messages` is updated with the edited messages, and messages that no longer exist are removed.
+        Returns the ids of the guilds whose messages were removed.
+
+        Arguments:
+            - messages: MutableMapping[int, discord.Message] - the announcement message of each guild, by guild id
+            - embed: discord.Embed - the embed to show
+        """
+        digest = self.digest(embed)
+        guilds = []
+        for guild in messages:
+            self.wanted[guild] = digest
+            if self.shown.get(guild) == digest:
+                self.skipped += 1
+            else:
+                guilds.append(guild)
+        deleted = await asyncio.gather(
+            *(self._edit(messages, guild, embed, digest) for guild in guilds)
+        )
+        return [guild for guild, gone in zip(guilds, deleted) if gone]
+
+    async def _edit(
+        self,
+        messages: MutableMapping[int, discord.Message],
+        guild: int,
+        embed: discord.Embed,
+        digest: str,
+    ) -> bool:
+        """
+        Edit the guild's message to show `embed`, returning whether the message was deleted
+        """
+        message = messages.get(guild)
+        if message is None:
+            return False
+        lock = self.channel_locks.setdefault(message.channel.id, asyncio.Lock())
+        async with lock:
+            # a newer announcement was made, or a concurrent one already showed this
+            if self.wanted.get(guild) != digest or self.shown.get(guild) == digest:
+                return False
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    edited = await message.edit(embed=embed)
+                except discord.RateLimited as e:
+                    # only raised when the wait is longer than the bot's max_ratelimit_timeout
+                    self.rate_limited += 1
+                    logger.warning(
+                        "Rate limited editing the announcement in guild %s for %.1f s, retrying next announcement",
+                        guild,
+                        e.retry_after,
+                    )
+                    return False
+                except discord.NotFound:
+                    self.failed += 1
+                    self.shown.pop(guild, None)
+                    messages.pop(guild, None)
+                    logger.warning(
+                        "The announcement in guild %s was deleted, unlinking it", guild
+                    )
+                    return True
+                except discord.HTTPException as e:
+                    self.failed += 1
+                    if e.status == 429:
+                        self.rate_limited += 1
+                    logger.warning(
+                        "Failed to edit the announcement in guild %s: %s", guild, e
+                    )
+                    return False
+                latency = time.perf_counter() - start
+            self.shown[guild] = digest
+
+        self.edited += 1
+        self.latency[guild] = latency
+        if guild in messages:
+            messages[guild] = edited
+        logger.debug(
+            "Edited the announcement in guild %s in %.1f ms", guild, latency * 1000
+        )
+        return False
@@ -0,0 +1,117 @@
+import json
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+# the monitor's frames are well under this; anything longer is garbage
+MAX_FRAME_LEN = 4096
+
+
+@dataclass
+class Frame:
+    seq: Optional[int]  # the monitor's sequence number, or None for legacy frames
+    timestamp: float  # the seconds since the epoch when the monitor read the sensor
+    is_open: bool  # whether the door was open
+    sensor: Optional[str] = None  # the sensor id, if the monitor has several sensors
+
+
+class FrameParser:
+    """
+    Incrementally parses the byte stream from the monitor into frames.
+
+    Frames are newline terminated utf8 JSON records, such as
+    `{"seq": 1, "ts": 1700000000.25, "open": true, "sensor": "front"}`.
+    The stream may be chunked arbitrarily: a chunk can hold many frames,
+    and a frame can be split across chunks, so partial frames are buffered
+    until the rest arrives. Frames that can't be parsed are counted and skipped.
+
+    Older monitors send bare `True`/`False` messages without any delimiter.
+    Those are still understood, even when several run together, and are
+    timestamped on arrival.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = b""
+        self.frames = 0
+        self.malformed = 0
+        self.gaps = 0  # frames missing according to the sequence numbers
+        self.last_seq: Optional[int] = None
+        # an oversize frame was dropped, and the rest of it must be skipped up to its newline
+        self.discarding = False
+
+    def feed(self, data: bytes) -> List[Frame]:
+        """
+        Parse a chunk of the stream, returning every frame it completes
+
+        Arguments:
+            - data: bytes - the chunk, as received from the connection
+        """
+        if self.discarding:
+            end = data.find(b"\n")
+            if end < 0:
+                return []
+            self.discarding = False
+            data = data[end + 1 :]
+        buffer = self.buffer + data if len(self.buffer) > 0 else data
+        if buffer[:1] in (b"T", b"F"):
+            self.buffer = b""
+            return self._feed_legacy(buffer)
+
+        *lines, self.buffer = buffer.split(b"\n")
+        if len(self.buffer) > MAX_FRAME_LEN:
+            self.malformed += 1
+            self.buffer = b""
+            self.discarding = True
+
+        frames = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+                frame = Frame(
+                    record.get("seq"),
+                    float(record["ts"]),
+                    bool(record["open"]),
+                    record.get("sensor"),
+                )
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # AttributeError and TypeError cover JSON that isn't an object
+                if len(line.strip()) > 0:
+                    self.malformed += 1
+                continue
+            self._check_seq(frame.seq)
+            frames.append(frame)
+
+        self.frames += len(frames)
+        return frames
+
+    def _check_seq(self, seq: Optional[int]) -> None:
+        if seq is None:
+            return
+        if self.last_seq is not None and seq > self.last_seq + 1:
+            self.gaps += seq - self.last_seq - 1
+        # a lower sequence number means the monitor restarted
+        self.last_seq = seq
+
+    def _feed_legacy(self, buffer: bytes) -> List[Frame]:
+        frames = []
+        now = time.time()
+        position = 0
+        while position < len(buffer):
+            if buffer.startswith(b"True", position):
+                frames.append(Frame(None, now, True))
+                position += 4
+            elif buffer.startswith(b"False", position):
+                frames.append(Frame(None, now, False))
+                position += 5
+            elif b"True".startswith(buffer[position:]) or b"False".startswith(
+                buffer[position:]
+            ):
+                # the rest of the message is in the next chunk
+                self.buffer = buffer[position:]
+                break
+            else:
+                self.malformed += 1
+                break
+
+        self.frames += len(frames)
+        return frames
@@ -0,0 +1,82 @@
+from array import array
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Union
+
+
+@dataclass
+class HistoryPoint:
+    timestamp: int  # the integer value of the seconds since the epoch
+    is_open: bool  # whether the door was open at this time
+
+
+class History:
+    """
+    A fixed capacity ring buffer of history points, oldest first.
+
+    Points are stored as parallel arrays, a signed 64 bit integer for the
+    timestamp and a byte for whether the door was open, so each point costs
+    9 bytes instead of a whole object. Appending is O(1), evicting the oldest
+    point once the history is full; indexing is O(1); and slicing only costs
+    the length of the slice. Points are handed out as `HistoryPoint`s, which
+    are created on access.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Create an empty history. Memory is only allocated as the history grows.
+
+        Arguments:
+            - capacity: int - the most points to keep
+        """
+        self.capacity = capacity
+        self.timestamps = array("q")
+        self.opens = bytearray()
+        self.start = 0  # where the oldest point is, once the buffer has wrapped
+        # every point ever appended, including evicted ones, so it changes on every append
+        self.appended = 0
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(self, point: HistoryPoint) -> None:
+        """
+        Add a point as the newest, evicting the oldest point if the history is full
+
+        Arguments:
+            - point: HistoryPoint - the point to add
+        """
+        if len(self.timestamps) < self.capacity:
+            self.timestamps.append(point.timestamp)
+            self.opens.append(point.is_open)
+        else:
+            self.timestamps[self.start] = point.timestamp
+            self.opens[self.start] = point.is_open
+            self.start = (self.start + 1) % self.capacity
+        self.appended += 1
+
+    def extend(self, points: Iterable[HistoryPoint]) -> None:
+        for point in points:
+            self.append(point)
+
+    def _physical(self, index: int) -> int:
+        """
+        Return where the `index`th oldest point is stored
+        """
+        return (self.start + index) % len(self.timestamps)
+
+    def __getitem__(
+        self, key: Union[int, slice]
+    ) -> Union[HistoryPoint, List[HistoryPoint]]:
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("history index out of range")
+        i = self._physical(key)
+        return HistoryPoint(self.timestamps[i], bool(self.opens[i]))
+
+    def __iter__(self) -> Iterator[HistoryPoint]:
+        for i in range(len(self)):
+            yield self[i]
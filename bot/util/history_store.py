@@ -0,0 +1,237 @@
+from typing import Iterable, List, Optional, Tuple
+
+from util.history import HistoryPoint
+from util.occupancy import Occupancy
+from util.sqlite_store import SQLiteStore
+
+# points read at once when catching the stored rollups up with the history
+CATCH_UP_BATCH = 10000
+
+
+class HistoryStore(SQLiteStore):
+    """
+    Persists the door history to SQLite, so it survives reloads, crashes and reboots.
+
+    Points are numbered by position, oldest first; since rows are never deleted,
+    a point's row id is its position offset by the first row id, so any page is
+    an indexed range lookup.
+
+    The occupancy rollups are stored too, in the same transaction as the points they
+    include, so they can be loaded on startup instead of being rebuilt from every point.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Create the store. Nothing is opened until `open` is awaited.
+
+        Arguments:
+            - path: str - the SQLite database file
+        """
+        super().__init__(path)
+        self.first_id = 1
+        # the number of points stored, kept in memory so it can be read synchronously
+        self.count = 0
+
+    def _open(self) -> None:
+        super()._open()
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                timestamp INTEGER NOT NULL,
+                is_open INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)"
+        )
+        # days are proleptic Gregorian ordinals, and hours are of the week, from Monday 00:00
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS occupancy_by_day (
+                day INTEGER PRIMARY KEY,
+                seconds REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS occupancy_by_week (
+                year INTEGER NOT NULL,
+                week INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                PRIMARY KEY (year, week)
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS occupancy_by_hour (
+                hour INTEGER PRIMARY KEY,
+                seconds REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS occupancy_longest (
+                seconds REAL NOT NULL,
+                start REAL NOT NULL
+            )
+            """
+        )
+        # a single row, with the number of points the rollups include
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS occupancy (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                points INTEGER NOT NULL,
+                open_count INTEGER NOT NULL,
+                open_seconds REAL NOT NULL,
+                opened_at REAL
+            )
+            """
+        )
+        self.conn.commit()
+
+        first, last = self.conn.execute("SELECT min(id), max(id) FROM history").fetchone()
+        if first is not None:
+            self.first_id = first
+            self.count = last - first + 1
+
+    def _write_rollups(self, rollups: dict, points: int) -> None:
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO occupancy_by_day (day, seconds) VALUES (?, ?)",
+            rollups["days"],
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO occupancy_by_week (year, week, seconds) VALUES (?, ?, ?)",
+            rollups["weeks"],
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO occupancy_by_hour (hour, seconds) VALUES (?, ?)",
+            rollups["hours"],
+        )
+        self.conn.execute("DELETE FROM occupancy_longest")
+        self.conn.executemany(
+            "INSERT INTO occupancy_longest (seconds, start) VALUES (?, ?)",
+            rollups["longest"],
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO occupancy (id, points, open_count, open_seconds, opened_at) "
+            "VALUES (0, ?, ?, ?, ?)",
+            (points, *rollups["totals"]),
+        )
+
+    def _insert(self, rows: List[tuple], rollups: Optional[dict], points: int) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO history (timestamp, is_open) VALUES (?, ?)", rows
+            )
+            if rollups is not None:
+                self._write_rollups(rollups, points)
+
+    async def append(
+        self, points: Iterable[HistoryPoint], occupancy: Optional[Occupancy] = None
+    ) -> None:
+        """
+        Store the points as the newest, in a single transaction
+
+        Arguments:
+            - points: Iterable[HistoryPoint] - the points to store, oldest first
+            - occupancy: Optional[Occupancy] - the rollups, which must already include the points,
+                to store in the same transaction. If None, only the points are stored.
+        """
+        rows = [(point.timestamp, int(point.is_open)) for point in points]
+        if len(rows) == 0:
+            return
+        self.count += len(rows)
+        # taken before handing off to the thread, so they include exactly these points
+        rollups = occupancy.changes() if occupancy is not None else None
+        await self._run(self._insert, rows, rollups, self.count)
+
+    def _read_rollups(self) -> Tuple[int, Optional[dict]]:
+        totals = self.conn.execute(
+            "SELECT points, open_count, open_seconds, opened_at FROM occupancy"
+        ).fetchone()
+        if totals is None:
+            return 0, None
+        return totals[0], {
+            "days": self.conn.execute("SELECT day, seconds FROM occupancy_by_day").fetchall(),
+            "weeks": self.conn.execute(
+                "SELECT year, week, seconds FROM occupancy_by_week"
+            ).fetchall(),
+            "hours": self.conn.execute("SELECT hour, seconds FROM occupancy_by_hour").fetchall(),
+            "longest": self.conn.execute(
+                "SELECT seconds, start FROM occupancy_longest"
+            ).fetchall(),
+            "totals": totals[1:],
+        }
+
+    def _save_rollups(self, rollups: dict, points: int) -> None:
+        with self.conn:
+            self._write_rollups(rollups, points)
+
+    async def load_occupancy(self, occupancy: Occupancy) -> None:
+        """
+        Load the stored rollups into `occupancy`, which must be empty. Points that the stored
+        rollups don't include yet, such as every point of a history stored before rollups were,
+        are added in batches and the rollups are stored again, so that only happens once.
+
+        Arguments:
+            - occupancy: Occupancy - the rollups to load into
+        """
+        included, rollups = await self._run(self._read_rollups)
+        if rollups is not None:
+            occupancy.restore(rollups)
+        if included < self.count:
+            for start in range(included, self.count, CATCH_UP_BATCH):
+                occupancy.extend(
+                    await self.fetch(start, min(start + CATCH_UP_BATCH, self.count))
+                )
+            await self._run(self._save_rollups, occupancy.changes(), self.count)
+
+    def _select(self, query: str, args: tuple) -> List[HistoryPoint]:
+        return [
+            HistoryPoint(timestamp, bool(is_open))
+            for timestamp, is_open in self.conn.execute(query, args)
+        ]
+
+    async def fetch(self, start: int, end: int) -> List[HistoryPoint]:
+        """
+        Return the points from position `start` up to but not including `end`, oldest first
+
+        Arguments:
+            - start: int - the position of the first point, where 0 is the oldest point
+            - end: int - the position after the last point
+        """
+        return await self._run(
+            self._select,
+            "SELECT timestamp, is_open FROM history WHERE id >= ? AND id < ? ORDER BY id",
+            (self.first_id + start, self.first_id + end),
+        )
+
+    async def tail(self, n: int) -> List[HistoryPoint]:
+        """
+        Return the newest `n` points, oldest first
+        """
+        return await self.fetch(max(self.count - n, 0), self.count)
+
+    async def between(self, since: int, until: int, limit: int) -> List[HistoryPoint]:
+        """
+        Return up to `limit` points with timestamps from `since` up to but not including `until`,
+        oldest first. The timestamp index serves both the range and the order, so only the
+        returned rows are read.
+
+        Arguments:
+            - since: int - the seconds since the epoch to start from
+            - until: int - the seconds since the epoch to end at
+            - limit: int - the most points to return
+        """
+        return await self._run(
+            self._select,
+            "SELECT timestamp, is_open FROM history WHERE timestamp >= ? AND timestamp < ? "
+            "ORDER BY timestamp, id LIMIT ?",
+            (since, until, limit),
+        )
@@ -0,0 +1,64 @@
+from typing import List, Tuple
+
+from util.sqlite_store import SQLiteStore
+
+
+class LinkStore(SQLiteStore):
+    """
+    Persists which message each guild's door announcements are in, so links
+    survive restarts and the same messages keep being edited.
+    """
+
+    def _open(self) -> None:
+        super()._open()
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS links (
+                guild_id INTEGER PRIMARY KEY,
+                channel_id INTEGER NOT NULL,
+                message_id INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def _select(self) -> List[Tuple[int, int, int]]:
+        return self.conn.execute(
+            "SELECT guild_id, channel_id, message_id FROM links"
+        ).fetchall()
+
+    async def links(self) -> List[Tuple[int, int, int]]:
+        """
+        Return every link, as (guild id, channel id, message id)
+        """
+        return await self._run(self._select)
+
+    def _execute(self, query: str, args: tuple) -> None:
+        with self.conn:
+            self.conn.execute(query, args)
+
+    async def link(self, guild_id: int, channel_id: int, message_id: int) -> None:
+        """
+        Store the message the guild's announcements are in, replacing any previous one
+
+        Arguments:
+            - guild_id: int - the id of the guild
+            - channel_id: int - the id of the channel the message is in
+            - message_id: int - the id of the message
+        """
+        await self._run(
+            self._execute,
+            "INSERT OR REPLACE INTO links (guild_id, channel_id, message_id) VALUES (?, ?, ?)",
+            (guild_id, channel_id, message_id),
+        )
+
+    async def unlink(self, guild_id: int) -> None:
+        """
+        Forget the message the guild's announcements are in
+
+        Arguments:
+            - guild_id: int - the id of the guild
+        """
+        await self._run(
+            self._execute, "DELETE FROM links WHERE guild_id = ?", (guild_id,)
+        )
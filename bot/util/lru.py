@@ -0,0 +1,47 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    A mapping that holds at most `capacity` entries, evicting the least
+    recently used entry to make room for a new one.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Create an empty cache
+
+        Arguments:
+            - capacity: int - the most entries to keep
+        """
+        self.capacity = capacity
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Return the entry for `key`, marking it as the most recently used,
+        or `default` if there is none
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
@@ -0,0 +1,269 @@
+import heapq
+import struct
+import zlib
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from util.history import HistoryPoint
+
+try:
+    import numpy as np
+except ImportError:  # only the heatmap needs numpy
+    np = None
+
+HOUR = 3600
+HOURS_PER_WEEK = 7 * 24
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# heatmap colours, from never open to the most open hour of the week
+COLD = (32, 34, 37)
+HOT = (87, 242, 135)
+
+
+def split_hours(start: float, end: float) -> Iterator[Tuple[datetime, float]]:
+    """
+    Split the time from `start` to `end` at every hour, yielding the local
+    time each piece starts at and how many seconds it lasts
+
+    Arguments:
+        - start: float - the seconds since the epoch to start from
+        - end: float - the seconds since the epoch to end at
+    """
+    position = start
+    while position < end:
+        boundary = min(position - position % HOUR + HOUR, end)
+        yield datetime.fromtimestamp(position), boundary - position
+        position = boundary
+
+
+class Occupancy:
+    """
+    Rollups of how long the door has been open, by day, by ISO week and by hour
+    of the week, along with the longest times it was left open.
+
+    Rollups are updated as each transition arrives, only splitting the time the
+    door was open at each hour, so reports are dictionary lookups instead of a
+    scan over the whole history. Times are bucketed in the bot's local time zone.
+    The buckets changed since `changes` was last called are tracked, so the
+    rollups can be stored alongside the history without rewriting all of them.
+    """
+
+    def __init__(self, longest: int = 5) -> None:
+        """
+        Create empty rollups
+
+        Arguments:
+            - longest: int - how many of the longest times the door was open to keep
+        """
+        self.by_day: Dict[date, float] = {}
+        self.by_week: Dict[Tuple[int, int], float] = {}  # by (ISO year, ISO week)
+        self.by_hour_of_week = [0.0] * HOURS_PER_WEEK  # from Monday 00:00
+        self.keep_longest = longest
+        self.longest: List[Tuple[float, float]] = []  # min-heap of (seconds, start)
+        self.open_count = 0
+        self.open_seconds = 0.0
+        self.opened_at: Optional[float] = None  # when the door was opened, if it's open
+        # buckets changed since the last call to `changes`
+        self.changed_days: Set[date] = set()
+        self.changed_weeks: Set[Tuple[int, int]] = set()
+        self.changed_hours: Set[int] = set()
+
+    def add(self, point: HistoryPoint) -> None:
+        """
+        Add a transition, which must be newer than every transition added before
+
+        Arguments:
+            - point: HistoryPoint - the transition to add
+        """
+        if point.is_open:
+            if self.opened_at is None:
+                self.opened_at = point.timestamp
+        elif self.opened_at is not None:
+            self._add_open(self.opened_at, point.timestamp)
+            self.opened_at = None
+
+    def extend(self, points: Iterable[HistoryPoint]) -> None:
+        for point in points:
+            self.add(point)
+
+    def _add_open(self, start: float, end: float) -> None:
+        seconds = end - start
+        self.open_count += 1
+        self.open_seconds += seconds
+        if len(self.longest) < self.keep_longest:
+            heapq.heappush(self.longest, (seconds, start))
+        elif seconds > self.longest[0][0]:
+            heapq.heapreplace(self.longest, (seconds, start))
+
+        for when, seconds in split_hours(start, end):
+            day = when.date()
+            self.by_day[day] = self.by_day.get(day, 0.0) + seconds
+            week = tuple(day.isocalendar()[:2])
+            self.by_week[week] = self.by_week.get(week, 0.0) + seconds
+            hour = when.weekday() * 24 + when.hour
+            self.by_hour_of_week[hour] += seconds
+            self.changed_days.add(day)
+            self.changed_weeks.add(week)
+            self.changed_hours.add(hour)
+
+    def changes(self) -> dict:
+        """
+        Return the buckets changed since the last call, with their new totals, along with
+        the longest times open and the totals, which are small enough to always include.
+        The days are proleptic Gregorian ordinals.
+        """
+        changes = {
+            "days": [(day.toordinal(), self.by_day[day]) for day in self.changed_days],
+            "weeks": [(*week, self.by_week[week]) for week in self.changed_weeks],
+            "hours": [(hour, self.by_hour_of_week[hour]) for hour in self.changed_hours],
+            "longest": list(self.longest),
+            "totals": (self.open_count, self.open_seconds, self.opened_at),
+        }
+        self.changed_days.clear()
+        self.changed_weeks.clear()
+        self.changed_hours.clear()
+        return changes
+
+    def restore(self, rollups: dict) -> None:
+        """
+        Replace the rollups with stored ones, in the form `changes` returns
+
+        Arguments:
+            - rollups: dict - the stored rollups
+        """
+        self.by_day = {date.fromordinal(day): seconds for day, seconds in rollups["days"]}
+        self.by_week = {(year, week): seconds for year, week, seconds in rollups["weeks"]}
+        self.by_hour_of_week = [0.0] * HOURS_PER_WEEK
+        for hour, seconds in rollups["hours"]:
+            self.by_hour_of_week[hour] = seconds
+        self.longest = list(rollups["longest"])
+        heapq.heapify(self.longest)
+        self.open_count, self.open_seconds, self.opened_at = rollups["totals"]
+        self.changed_days.clear()
+        self.changed_weeks.clear()
+        self.changed_hours.clear()
+
+    def _ongoing(self, now: float) -> Tuple[Dict[date, float], Dict[tuple, float]]:
+        """
+        Return the seconds the door has been open since it was last opened, by day and by week
+        """
+        by_day: Dict[date, float] = {}
+        by_week: Dict[tuple, float] = {}
+        if self.opened_at is not None:
+            for when, seconds in split_hours(self.opened_at, now):
+                day = when.date()
+                by_day[day] = by_day.get(day, 0.0) + seconds
+                week = tuple(day.isocalendar()[:2])
+                by_week[week] = by_week.get(week, 0.0) + seconds
+        return by_day, by_week
+
+    def days(self, now: float, count: int = 7) -> List[Tuple[date, float]]:
+        """
+        Return the seconds the door was open on each of the last `count` days, newest first,
+        including the time it has been open for now
+
+        Arguments:
+            - now: float - the current seconds since the epoch
+            - count: int - how many days to return
+        """
+        ongoing, _ = self._ongoing(now)
+        today = datetime.fromtimestamp(now).date().toordinal()
+        return [
+            (day, self.by_day.get(day, 0.0) + ongoing.get(day, 0.0))
+            for day in (date.fromordinal(today - i) for i in range(count))
+        ]
+
+    def weeks(self, now: float, count: int = 4) -> List[Tuple[Tuple[int, int], float]]:
+        """
+        Return the seconds the door was open in each of the last `count` ISO weeks, newest first,
+        including the time it has been open for now
+
+        Arguments:
+            - now: float - the current seconds since the epoch
+            - count: int - how many weeks to return
+        """
+        _, ongoing = self._ongoing(now)
+        today = datetime.fromtimestamp(now).date().toordinal()
+        weeks = [
+            tuple(date.fromordinal(today - 7 * i).isocalendar()[:2])
+            for i in range(count)
+        ]
+        return [
+            (week, self.by_week.get(week, 0.0) + ongoing.get(week, 0.0))
+            for week in weeks
+        ]
+
+    def busiest_hours(self, count: int = 3) -> List[Tuple[int, int, float]]:
+        """
+        Return the `count` hours of the week the door was open the longest, as
+        (weekday, hour, seconds) with Monday as weekday 0
+        """
+        hours = heapq.nlargest(
+            count, range(HOURS_PER_WEEK), key=self.by_hour_of_week.__getitem__
+        )
+        return [
+            (hour // 24, hour % 24, self.by_hour_of_week[hour])
+            for hour in hours
+            if self.by_hour_of_week[hour] > 0
+        ]
+
+    def longest_streaks(self) -> List[Tuple[float, float]]:
+        """
+        Return the longest times the door was left open, as (seconds, start), longest first
+        """
+        return sorted(self.longest, reverse=True)
+
+    @property
+    def average_open(self) -> Optional[float]:
+        """
+        The average seconds the door stayed open each time it was opened
+        """
+        return self.open_seconds / self.open_count if self.open_count > 0 else None
+
+    def heatmap(self, scale: int = 16) -> Optional[bytes]:
+        """
+        Render how long the door was open at each hour of the week as a PNG,
+        with a row per weekday and a column per hour. Returns None if numpy isn't installed.
+
+        Arguments:
+            - scale: int - the size of each hour's square, in pixels
+        """
+        if np is None:
+            return None
+
+        grid = np.asarray(self.by_hour_of_week, dtype=np.float64).reshape(7, 24)
+        peak = grid.max()
+        weight = grid / peak if peak > 0 else grid
+        cold = np.asarray(COLD, dtype=np.float64)
+        hot = np.asarray(HOT, dtype=np.float64)
+        pixels = (cold + weight[..., None] * (hot - cold)).astype(np.uint8)
+        pixels = pixels.repeat(scale, axis=0).repeat(scale, axis=1)
+        return encode_png(pixels)
+
+
+def encode_png(pixels) -> bytes:
+    """
+    Encode an RGB image as a PNG
+
+    Arguments:
+        - pixels: numpy.ndarray - the image, as uint8 of shape (height, width, 3)
+    """
+    height, width, _ = pixels.shape
+    # every row starts with filter type 0, no filtering
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 3)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data))
+        )
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows.tobytes()))
+        + chunk(b"IEND", b"")
+    )
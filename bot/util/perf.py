@@ -0,0 +1,231 @@
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import discord
+
+# The bot's metrics are exported in the same Prometheus text format as the monitor's,
+# so both can be scraped the same way. The two services don't share any code, and the
+# bot's metrics also need labels, quantiles and maxima for `-perf`, so they're their own.
+
+# in seconds, from half a millisecond up to ten seconds, since Discord requests can
+# wait out rate limits
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Counter:
+    """
+    A count that only goes up, such as the 429s Discord answered with, one per label set
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: str = "") -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self.labels} {self.value}"]
+
+
+class Histogram:
+    """
+    How long a command, request or announcement took, one per label set. The
+    observations are counted into buckets, which `-perf` estimates quantiles from,
+    and the slowest one is kept as well.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: str = "",
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = list(buckets)
+        # the last count is for observations above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """
+        Observe how long the body of the `with` block takes
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Return an upper bound of the `q` quantile, from the bucket it falls in,
+        or None if nothing was observed
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def samples(self) -> List[str]:
+        # labels go inside the braces, next to `le`
+        extra = self.labels[1:-1] + "," if self.labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{{extra}le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{{extra}le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum{self.labels} {self.sum}")
+        lines.append(f"{self.name}_count{self.labels} {self.count}")
+        return lines
+
+
+class Metrics:
+    """
+    Every performance metric of the bot, by name and labels, for `-perf` to summarize
+    and export. Cogs look their metrics up here when they're imported, and since the
+    registry is module state rather than cog state, the numbers carry on through
+    `-reload` instead of starting over.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labels: str = "") -> Counter:
+        return self.metrics.setdefault(name + labels, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: str = "") -> Histogram:
+        return self.metrics.setdefault(name + labels, Histogram(name, help, labels))
+
+    def render(self) -> str:
+        """
+        Return every metric in the Prometheus text format, for `-perf export` and the metrics file.
+        Label sets of the same metric share its HELP and TYPE lines.
+        """
+        lines = []
+        described = set()
+        for metric in self.metrics.values():
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# the bot's metrics, shared by every cog
+registry = Metrics()
+
+rate_limits = registry.counter(
+    "bot_discord_rate_limits_total", "Discord responses that were 429 Too Many Requests"
+)
+loop_lag = registry.histogram(
+    "bot_event_loop_lag_seconds",
+    "How much later than scheduled the event loop woke the lag sampler",
+)
+
+
+def command_time(command: str) -> Histogram:
+    return registry.histogram(
+        "bot_command_seconds",
+        "How long commands took, including sending their replies",
+        f'{{command="{command}"}}',
+    )
+
+
+def http_time(method: str) -> Histogram:
+    return registry.histogram(
+        "bot_discord_http_seconds",
+        "How long requests to Discord took, including waiting on rate limits",
+        f'{{method="{method}"}}',
+    )
+
+
+class RateLimitCounter(logging.Handler):
+    """
+    Counts the 429s that discord.py logs, since it retries them without raising
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not isinstance(record.msg, str) or record.levelno < logging.WARNING:
+            return
+        # a global rate limit is also logged as "Global rate limit has been hit", which
+        # would count the same 429 twice
+        if "responded with 429" in record.msg:
+            rate_limits.inc()
+
+
+def instrument_http(http: discord.http.HTTPClient) -> None:
+    """
+    Time every request the bot makes to Discord, by method
+    """
+    if "request" in http.__dict__:
+        return
+    request = http.request
+
+    async def timed_request(route: discord.http.Route, **kwargs):
+        with http_time(route.method).time():
+            return await request(route, **kwargs)
+
+    http.request = timed_request
+
+
+def uninstrument_http(http: discord.http.HTTPClient) -> None:
+    """
+    Stop timing the requests the bot makes to Discord
+    """
+    http.__dict__.pop("request", None)
+
+
+async def sample_loop_lag(interval: float = 0.5) -> None:
+    """
+    Measure how late the event loop wakes a task that sleeps for `interval` seconds, forever.
+    A loop blocked by a slow callback shows up as lag.
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(time.perf_counter() - start - interval, 0.0))
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# the status block starts with the total bytes of frames the monitor has ever written
+# to it and the total bytes the bot has read, followed by a ring buffer of the frames.
+# This must match the monitor's `SHM_HEADER`.
+HEADER = struct.Struct("<QQ")
+# each write is a record of where it starts in the stream, how long it is, and a CRC32
+# of both plus the frames. This must match the monitor's `SHM_RECORD`.
+RECORD = struct.Struct("<QII")
+# polls a record can stay unreadable for before it's skipped
+MAX_STALLED_POLLS = 100
+
+
+class SharedStatusReader:
+    """
+    Watches the shared memory status block the monitor writes frames to, when both run on
+    the same host, and feeds new frames to a Protocol as if they'd arrived over a connection.
+    A poll that finds nothing new only reads the header, so polling often is cheap.
+
+    The monitor can't order its stores, so on a CPU that reorders them the count of bytes
+    written can be seen before the frames it covers. A record is only read once its
+    position, length and checksum all match, and is retried on the next poll otherwise.
+
+    Frames the monitor wrote while the bot wasn't running are still in the block, and are read
+    on startup. The reader can be closed like an `asyncio.Server`, so the Monitor cog treats
+    it as its server.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        protocol_factory: Callable[[], asyncio.Protocol],
+        poll_every: float = 0.01,
+    ) -> None:
+        """
+        Create the reader. Nothing is read until `start` is awaited.
+
+        Arguments:
+            - path: str - the path of the file backing the status block
+            - protocol_factory: Callable[[], asyncio.Protocol] - creates the Protocol to feed frames to
+            - poll_every: float - seconds between checks for new frames
+        """
+        self.path = path
+        self.protocol_factory = protocol_factory
+        self.poll_every = poll_every
+        self.mm: Optional[mmap.mmap] = None
+        self.stalled = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Start watching the status block
+        """
+        self.task = asyncio.create_task(self.watch())
+
+    def _open(self) -> bool:
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+            try:
+                if os.fstat(fd).st_size <= HEADER.size:
+                    return False
+                self.mm = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+        except FileNotFoundError:
+            return False
+        logger.info("Reading door updates from %s", self.path)
+        return True
+
+    def _ring(self, position: int, length: int) -> bytes:
+        ring_size = len(self.mm) - HEADER.size
+        position %= ring_size
+        first = min(length, ring_size - position)
+        offset = HEADER.size + position
+        return self.mm[offset : offset + first] + self.mm[
+            HEADER.size : HEADER.size + length - first
+        ]
+
+    def _record(self, position: int, written: int) -> Optional[bytes]:
+        """
+        Return the frames of the record at `position`, or None if it isn't all there yet
+        """
+        if written - position < RECORD.size:
+            return None
+        stored, length, checksum = RECORD.unpack(self._ring(position, RECORD.size))
+        if stored != position or position + RECORD.size + length > written:
+            return None
+        data = self._ring(position + RECORD.size, length)
+        if zlib.crc32(data, zlib.crc32(struct.pack("<QI", position, length))) != checksum:
+            return None
+        return data
+
+    def read(self) -> bytes:
+        """
+        Return the frames written since the last read, and mark them read
+        """
+        written, read = HEADER.unpack_from(self.mm, 0)
+        if written == read:
+            return b""
+
+        frames = []
+        while read < written:
+            data = self._record(read, written)
+            if data is None:
+                break
+            frames.append(data)
+            read += RECORD.size + len(data)
+
+        if read == written:
+            self.stalled = 0
+        else:
+            self.stalled += 1
+            if self.stalled >= MAX_STALLED_POLLS:
+                logger.warning(
+                    "Skipping %d bytes of the status block that never checked out",
+                    written - read,
+                )
+                read = written
+                self.stalled = 0
+        # the frames are copied out, so the monitor can overwrite them
+        struct.pack_into("<Q", self.mm, 8, read)
+        return b"".join(frames)
+
+    async def watch(self) -> None:
+        """
+        Feed new frames to the Protocol every `poll_every` seconds, forever.
+        Until the monitor creates the status block, check for it just as often.
+        """
+        while not self._open():
+            await asyncio.sleep(self.poll_every)
+        protocol = self.protocol_factory()
+        while True:
+            data = self.read()
+            if len(data) > 0:
+                protocol.data_received(data)
+            await asyncio.sleep(self.poll_every)
+
+    def close(self) -> None:
+        """
+        Stop watching the status block. Frames written after this are read on the next start.
+        """
+        if self.task is not None:
+            self.task.cancel()
+
+    async def wait_closed(self) -> None:
+        """
+        Wait for the reader to stop, and unmap the status block
+        """
+        if self.task is not None:
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
@@ -0,0 +1,54 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+
+class SQLiteStore:
+    """
+    A SQLite database that is only used from a single background thread, so
+    the event loop is never blocked on disk and writes happen in the order
+    they were made. The database is in WAL mode, so a write never blocks a read.
+    Subclasses create their tables by extending `_open`.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Create the store. Nothing is opened until `open` is awaited.
+
+        Arguments:
+            - path: str - the SQLite database file
+        """
+        self.path = path
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=type(self).__name__
+        )
+        self.conn: Optional[sqlite3.Connection] = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    def _open(self) -> None:
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    async def open(self) -> None:
+        """
+        Open the database, creating it if it doesn't exist
+        """
+        await self._run(self._open)
+
+    def _close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    async def close(self) -> None:
+        """
+        Close the database, once every pending write has finished
+        """
+        await self._run(self._close)
+        self.executor.shutdown(wait=False)
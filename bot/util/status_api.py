@@ -0,0 +1,321 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from util.history import HistoryPoint
+from util.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"json": "application/json", "plaintext": "text/plain"}
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+# the longest a client can long-poll for, in seconds
+MAX_WAIT = 60
+# seconds between comments sent to idle event streams, so proxies don't close them
+KEEPALIVE_EVERY = 15
+# the end of a time range that has no `until`
+MAX_TIMESTAMP = 2**63 - 1
+
+
+class StatusAPI:
+    """
+    Serves the door status and history over HTTP, from the bot's event loop.
+
+    - `GET /status` - whether the door is open, and since when
+    - `GET /history?page=0&size=10` - a page of the history, newest first
+    - `GET /history?since=1700000000&until=1700086400&size=10` - the first points
+        in a time range, oldest first, where `until` is optional
+    - `GET /events` - server-sent events with the status, whenever it changes
+
+    `/status` and `/history` take `format=json` (the default) or `format=plaintext`.
+    Responses carry an ETag, and a request whose `If-None-Match` still matches gets
+    an empty 304. With `wait=seconds`, such a request instead waits until the door
+    changes, so clients can long-poll. The status and the first page of the history
+    are rendered once per change, and other pages are rendered once per change
+    they're asked for, so polling clients only cost a dictionary lookup.
+    """
+
+    def __init__(
+        self,
+        get_status: Callable[[], Tuple[bool, Optional[int]]],
+        get_points: Callable[[int, int], Awaitable[List[HistoryPoint]]],
+        get_length: Callable[[], int],
+        get_between: Callable[[int, int, int], Awaitable[List[HistoryPoint]]],
+        host: str = "localhost",
+        port: int = 8080,
+    ) -> None:
+        """
+        Create the API. Nothing is served until `start` is awaited.
+
+        Arguments:
+            - get_status: Callable[[], Tuple[bool, Optional[int]]] - returns whether the door is open,
+                and the seconds since the epoch when it last changed, if that's known
+            - get_points: Callable[[int, int], Awaitable[List[HistoryPoint]]] - returns the history points
+                from a position up to but not including another, oldest first, where 0 is the oldest
+            - get_length: Callable[[], int] - returns the number of points in the whole history
+            - get_between: Callable[[int, int, int], Awaitable[List[HistoryPoint]]] - returns up to a number
+                of history points with timestamps from a time up to but not including another, oldest first
+            - host: str - the interface to listen on
+            - port: int - the port to listen on
+        """
+        self.get_status = get_status
+        self.get_points = get_points
+        self.get_length = get_length
+        self.get_between = get_between
+        self.host = host
+        self.port = port
+
+        # bumped on every change, and part of every ETag along with when the API started,
+        # so ETags from before a restart never match
+        self.started = int(time.time())
+        self.version = 0
+        self.status: dict = {}
+        self.status_bodies: Dict[str, bytes] = {}  # the rendered status, by format
+        self.history_bodies = LRUCache(64)  # rendered pages and ranges, by version, request and format
+        self.changed = asyncio.Event()  # replaced after every change, so waiters wake once
+        self.closing = False
+
+        self.app = web.Application()
+        self.app.router.add_get("/status", self.handle_status)
+        self.app.router.add_get("/history", self.handle_history)
+        self.app.router.add_get("/events", self.handle_events)
+        self.runner: Optional[web.AppRunner] = None
+
+        # stats
+        self.requests = 0
+        self.not_modified = 0
+
+    async def start(self) -> None:
+        """
+        Render the current state and start serving
+        """
+        await self.refresh()
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port, shutdown_timeout=1)
+        await site.start()
+        logger.info("Serving the door status on %s:%s", self.host, self.port)
+
+    async def close(self) -> None:
+        """
+        Stop serving, ending any long-polls and event streams
+        """
+        self.closing = True
+        self.changed.set()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def refresh(self) -> None:
+        """
+        Render the status and the first page of the history again, and wake every waiting client.
+        Call this whenever the door changes.
+        """
+        is_open, since = self.get_status()
+        self.version += 1
+        self.status = {"open": is_open, "since": since}
+        for format in FORMATS:
+            self.status_bodies[format] = self.render_status(format)
+            await self.history_body(0, DEFAULT_PAGE_SIZE, format)
+
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def render_status(self, format: str) -> bytes:
+        if format == "json":
+            return json.dumps(self.status).encode()
+        since = self.status["since"]
+        return (
+            f"door\nsince: {format_time(since) if since is not None else 'unknown'}\n"
+            f"is: {'open' if self.status['open'] else 'closed'}\n"
+        ).encode()
+
+    async def history_body(self, page: int, size: int, format: str) -> bytes:
+        """
+        Return the rendered page of the history, rendering it if it isn't cached for this version
+        """
+        key = (self.version, page, size, format)
+        body = self.history_bodies.get(key)
+        if body is not None:
+            return body
+
+        total = self.get_length()
+        start = max(total - (page + 1) * size, 0)
+        end = max(total - page * size, 0)
+        points = list(reversed(await self.get_points(start, end)))
+        body = render_points(
+            points,
+            format,
+            {"page": page, "size": size, "total": total, "pages": (total + size - 1) // size},
+        )
+        self.history_bodies[key] = body
+        return body
+
+    async def range_body(self, since: int, until: int, size: int, format: str) -> bytes:
+        """
+        Return the rendered first points of the time range, rendering them if they aren't cached for this version
+        """
+        key = (self.version, "range", since, until, size, format)
+        body = self.history_bodies.get(key)
+        if body is not None:
+            return body
+
+        # one more than asked for, to tell whether there are more
+        points = await self.get_between(since, until, size + 1)
+        body = render_points(
+            points[:size],
+            format,
+            {"since": since, "until": until, "size": size, "more": len(points) > size},
+        )
+        self.history_bodies[key] = body
+        return body
+
+    def etag(self, *parts) -> str:
+        parts = (self.started, self.version, *parts)
+        return '"' + "-".join(str(part) for part in parts) + '"'
+
+    async def respond(
+        self,
+        request: web.Request,
+        etag: Callable[[], str],
+        body: Callable[[], Awaitable[bytes]],
+        format: str,
+    ) -> web.StreamResponse:
+        """
+        Respond with the body, or with 304 if the client already has it. If the client asks to wait,
+        a request that would be a 304 instead waits for the next change.
+        """
+        self.requests += 1
+        try:
+            wait = min(float(request.query.get("wait", 0)), MAX_WAIT)
+        except ValueError:
+            raise web.HTTPBadRequest(text="wait must be a number of seconds")
+
+        if matches(request.headers.get("If-None-Match"), etag()) and wait > 0:
+            try:
+                await asyncio.wait_for(self.changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        if matches(request.headers.get("If-None-Match"), etag()):
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag()})
+
+        return web.Response(
+            body=await body(),
+            content_type=FORMATS[format],
+            headers={"ETag": etag(), "Cache-Control": "no-cache"},
+        )
+
+    @staticmethod
+    def get_format(request: web.Request) -> str:
+        format = request.query.get("format", "json")
+        if format not in FORMATS:
+            raise web.HTTPBadRequest(text="format must be json or plaintext")
+        return format
+
+    async def handle_status(self, request: web.Request) -> web.StreamResponse:
+        format = self.get_format(request)
+
+        async def body() -> bytes:
+            return self.status_bodies[format]
+
+        return await self.respond(request, lambda: self.etag(format), body, format)
+
+    async def handle_history(self, request: web.Request) -> web.StreamResponse:
+        format = self.get_format(request)
+        try:
+            page = int(request.query.get("page", 0))
+            size = int(request.query.get("size", DEFAULT_PAGE_SIZE))
+            since = request.query.get("since")
+            since = int(since) if since is not None else None
+            until = int(request.query.get("until", MAX_TIMESTAMP))
+        except ValueError:
+            raise web.HTTPBadRequest(text="page, size, since and until must be integers")
+        if page < 0 or not 1 <= size <= MAX_PAGE_SIZE:
+            raise web.HTTPBadRequest(
+                text=f"page must be at least 0, and size from 1 to {MAX_PAGE_SIZE}"
+            )
+
+        if since is not None:
+            return await self.respond(
+                request,
+                lambda: self.etag("range", since, until, size, format),
+                lambda: self.range_body(since, until, size, format),
+                format,
+            )
+
+        return await self.respond(
+            request,
+            lambda: self.etag(page, size, format),
+            lambda: self.history_body(page, size, format),
+            format,
+        )
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        try:
+            while not self.closing:
+                changed = self.changed
+                await response.write(
+                    f"id: {self.version}\ndata: {json.dumps(self.status)}\n\n".encode()
+                )
+                while not changed.is_set():
+                    try:
+                        await asyncio.wait_for(changed.wait(), KEEPALIVE_EVERY)
+                    except asyncio.TimeoutError:
+                        await response.write(b": keepalive\n\n")
+        except ConnectionResetError:
+            pass
+        return response
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Return whether an `If-None-Match` header matches the ETag
+    """
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
+def render_points(points: List[HistoryPoint], format: str, fields: dict) -> bytes:
+    """
+    Render history points as JSON, along with the other fields, or as a line of plain text per point
+
+    Arguments:
+        - points: List[HistoryPoint] - the points to render, in the order to show them
+        - format: str - `json` or `plaintext`
+        - fields: dict - the fields besides the points, which only JSON includes
+    """
+    if format == "json":
+        return json.dumps(
+            {
+                **fields,
+                "points": [
+                    {"timestamp": point.timestamp, "open": point.is_open}
+                    for point in points
+                ],
+            }
+        ).encode()
+    return "".join(
+        f"{format_time(point.timestamp)} {'open' if point.is_open else 'closed'}\n"
+        for point in points
+    ).encode()
+
+
+def format_time(timestamp: int) -> str:
+    return (
+        datetime.fromtimestamp(timestamp)
+        .astimezone()
+        .strftime("%Y-%m-%d %H:%M:%S UTC%z")
+    )
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+# `2024-01-01 12:00:00,123:INFO:name:message`, as written by the monitor's text log format
+TEXT_LINE = re.compile(
+    r"^(?P<time>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[,.]\d+)?):(?P<level>[A-Z]+):"
+)
+# `INFO:name:message`, as written by older versions of the monitor
+BARE_LINE = re.compile(r"^(?P<level>DEBUG|INFO|WARNING|ERROR|CRITICAL):")
+
+DURATION = re.compile(r"^(?P<amount>\d+)(?P<unit>[smhdw])$")
+UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse either an ISO timestamp or a duration ago, such as `30m`, `2h` or `1d`
+
+    Arguments:
+        - value: Optional[str] - the time to parse, or None
+    """
+    if value is None:
+        return None
+    match = DURATION.match(value.lower())
+    if match is not None:
+        amount = int(match["amount"])
+        return datetime.now() - timedelta(**{UNITS[match["unit"]]: amount})
+    return datetime.fromisoformat(value)
+
+
+def parse_line(line: str) -> Tuple[Optional[datetime], Optional[int]]:
+    """
+    Return the time and level of a log line, either of which are None if they can't be found
+
+    Arguments:
+        - line: str - a line from the monitor's log, in either the text or JSON format
+    """
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            return datetime.fromisoformat(record["t"]), logging.getLevelName(
+                record["lvl"]
+            )
+        except (ValueError, KeyError):
+            return None, None
+
+    match = TEXT_LINE.match(line)
+    if match is not None:
+        return (
+            datetime.fromisoformat(match["time"].replace(",", ".")),
+            logging.getLevelName(match["level"]),
+        )
+    match = BARE_LINE.match(line)
+    if match is not None:
+        return None, logging.getLevelName(match["level"])
+    return None, None
+
+
+def tail(
+    path: str,
+    count: int,
+    level: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    block_size: int = 8192,
+) -> List[str]:
+    """
+    Return the last `count` lines of a file, oldest first.
+
+    The file is read backwards from the end, a block at a time, stopping
+    as soon as enough lines are found, so the cost doesn't depend on the
+    size of the file. When filtering, lines that don't have a time or level
+    (such as traceback lines) are left out, and reading stops at the first
+    line older than `since`, since the log is in chronological order.
+
+    Arguments:
+        - path: str - the file to read
+        - count: int - the number of lines to return
+        - level: Optional[int] - only return lines at or above this logging level
+        - since: Optional[datetime] - only return lines at or after this time
+        - until: Optional[datetime] - only return lines at or before this time
+        - block_size: int - how many bytes to read at a time
+    """
+    filtering = level is not None or since is not None or until is not None
+    found = []
+
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0 and len(found) < count:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b"\n")
+            # the first piece may be the end of a line that started in an earlier block
+            remainder = lines.pop(0) if position > 0 else b""
+
+            for raw in reversed(lines):
+                if len(raw) == 0:
+                    continue
+                line = raw.decode(errors="replace")
+                if filtering:
+                    time, line_level = parse_line(line)
+                    if since is not None and time is not None and time < since:
+                        return list(reversed(found))
+                    if (
+                        line_level is None
+                        or (level is not None and line_level < level)
+                        or ((since is not None or until is not None) and time is None)
+                        or (until is not None and time > until)
+                    ):
+                        continue
+                found.append(line)
+                if len(found) == count:
+                    break
+
+    return list(reversed(found))
+
+
+def chunk_lines(lines: List[str], limit: int) -> List[str]:
+    """
+    Join lines into as few strings as possible, each at most `limit` characters long.
+    Lines longer than the limit are split.
+
+    Arguments:
+        - lines: List[str] - the lines to join
+        - limit: int - the most characters in each string
+    """
+    chunks = []
+    current = ""
+    for line in lines:
+        while len(line) > limit:
+            if len(current) > 0:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) > 0 and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = line if len(current) == 0 else f"{current}\n{line}"
+    if len(current) > 0:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,198 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Mapping, Optional
+
+
+class Filter(ABC):
+    """
+    An abstract class for a filter that sits between a monitor's raw samples and
+    its callback, so that bounces of the door sensor are dropped before they are sent.
+
+    A filter is called with every raw sample, and returns the filtered state.
+    It keeps count of the raw changes it suppressed, meaning the raw changes
+    that never made it to the filtered state.
+    """
+
+    def __init__(self) -> None:
+        self.output: Optional[bool] = None
+        self.last_raw: Optional[bool] = None
+        self.raw_changes = 0
+        self.output_changes = 0
+
+    def __call__(self, value: bool, now: float) -> bool:
+        """
+        Filter a raw sample, returning the filtered state
+
+        Arguments:
+            - value: bool - the raw sample
+            - now: float - the current time, from `time.monotonic`
+        """
+        if self.last_raw is not None and value != self.last_raw:
+            self.raw_changes += 1
+        self.last_raw = value
+
+        output = value if self.output is None else self.apply(value, now)
+        if self.output is not None and output != self.output:
+            self.output_changes += 1
+        self.output = output
+        return output
+
+    @property
+    def suppressed(self) -> int:
+        return max(self.raw_changes - self.output_changes, 0)
+
+    @abstractmethod
+    def apply(self, value: bool, now: float) -> bool:
+        """
+        Return the filtered state given a new raw sample. Only called once there is
+        a filtered state, in `self.output`.
+        """
+
+    def next_check(self, now: float) -> Optional[float]:
+        """
+        Return how many seconds until the filtered state could change without a new
+        edge, so an edge triggered monitor knows to sample again, or None if it can't
+        """
+        return None
+
+
+class Debounce(Filter):
+    """
+    Only changes state once the raw samples have held the new state for `window` seconds
+    """
+
+    def __init__(self, window: float) -> None:
+        super().__init__()
+        self.window = window
+        self.candidate_since: Optional[float] = None
+
+    def apply(self, value: bool, now: float) -> bool:
+        if value == self.output:
+            self.candidate_since = None
+            return self.output
+        if self.candidate_since is None:
+            self.candidate_since = now
+        if now - self.candidate_since >= self.window:
+            self.candidate_since = None
+            return value
+        return self.output
+
+    def next_check(self, now: float) -> Optional[float]:
+        if self.candidate_since is None:
+            return None
+        return max(self.window - (now - self.candidate_since), 0)
+
+
+class Majority(Filter):
+    """
+    Changes state to whichever state the majority of the last `n` samples agree on
+    """
+
+    def __init__(self, n: int, sample_every: float = 0.01) -> None:
+        """
+        Arguments:
+            - n: int - the number of samples to vote over
+            - sample_every: float - how often, in seconds, to sample while the samples disagree
+        """
+        super().__init__()
+        self.n = n
+        self.sample_every = sample_every
+        self.samples = deque(maxlen=n)
+
+    def __call__(self, value: bool, now: float) -> bool:
+        self.samples.append(value)
+        return super().__call__(value, now)
+
+    def apply(self, value: bool, now: float) -> bool:
+        opens = sum(self.samples)
+        closes = len(self.samples) - opens
+        if opens == closes:
+            return self.output
+        return opens > closes
+
+    def next_check(self, now: float) -> Optional[float]:
+        if len(self.samples) > 0 and any(s != self.samples[-1] for s in self.samples):
+            return self.sample_every
+        return None
+
+
+class MinDwell(Filter):
+    """
+    Holds each state for at least `min_time` seconds before allowing another change
+    """
+
+    def __init__(self, min_time: float) -> None:
+        super().__init__()
+        self.min_time = min_time
+        self.last_change: Optional[float] = None
+
+    def __call__(self, value: bool, now: float) -> bool:
+        if self.last_change is None:
+            self.last_change = now
+        return super().__call__(value, now)
+
+    def apply(self, value: bool, now: float) -> bool:
+        if value != self.output and now - self.last_change >= self.min_time:
+            self.last_change = now
+            return value
+        return self.output
+
+    def next_check(self, now: float) -> Optional[float]:
+        if self.last_raw is None or self.last_raw == self.output:
+            return None
+        return max(self.min_time - (now - self.last_change), 0)
+
+
+class FilterChain(Filter):
+    """
+    Runs samples through several filters, in order
+    """
+
+    def __init__(self, filters: List[Filter]) -> None:
+        super().__init__()
+        self.filters = filters
+
+    def __call__(self, value: bool, now: float) -> bool:
+        if self.last_raw is not None and value != self.last_raw:
+            self.raw_changes += 1
+        self.last_raw = value
+
+        output = self.apply(value, now)
+        if self.output is not None and output != self.output:
+            self.output_changes += 1
+        self.output = output
+        return output
+
+    def apply(self, value: bool, now: float) -> bool:
+        for f in self.filters:
+            value = f(value, now)
+        return value
+
+    def next_check(self, now: float) -> Optional[float]:
+        checks = [f.next_check(now) for f in self.filters]
+        checks = [check for check in checks if check is not None]
+        return min(checks) if len(checks) > 0 else None
+
+
+def filter_from_config(vals: Mapping[str, str]) -> Optional[Filter]:
+    """
+    Build the filter described by the `DEBOUNCE`, `MAJORITY_OF` and `MIN_DWELL`
+    configuration values, or None if none of them are set. Each monitor needs
+    its own filter, since filters keep state.
+
+    Arguments:
+        - vals: Mapping[str, str] - the configuration values
+    """
+    filters = []
+    if "MAJORITY_OF" in vals:
+        filters.append(Majority(int(vals["MAJORITY_OF"])))
+    if "DEBOUNCE" in vals:
+        filters.append(Debounce(float(vals["DEBOUNCE"])))
+    if "MIN_DWELL" in vals:
+        filters.append(MinDwell(float(vals["MIN_DWELL"])))
+
+    if len(filters) == 0:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return FilterChain(filters)
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+send_time = registry.histogram(
+    "monitor_http_send_seconds",
+    "How long it took to send an update to the HTTP endpoint, including retries",
+)
+send_failures = registry.counter(
+    "monitor_http_failures_total", "Updates that failed to send to the HTTP endpoint"
+)
+
+
+class HTTPPublisher:
+    """
+    Publishes door updates to an HTTP endpoint from a background thread,
+    so a slow endpoint never stalls the monitor loop.
+
+    Only the latest state is kept waiting to be sent. If several updates
+    arrive while a request is in flight, they are coalesced into one, and
+    if the latest state is the one the endpoint already has, nothing is sent.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        timeout: float = 5.0,
+        retries: int = 3,
+        stats_every: float = 3600.0,
+    ) -> None:
+        """
+        Initialize the publisher and start its worker thread
+
+        Arguments:
+            - endpoint: str - the URL to `POST` updates to
+            - timeout: float - seconds to wait for the endpoint to connect or respond
+            - retries: int - how many times to retry a failed request before giving up on it
+            - stats_every: float - seconds between logging the queue depth and send latency
+        """
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.stats_every = stats_every
+
+        # connections are pooled and kept alive between requests
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "text/plain"
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"],
+        )
+        self.session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=1))
+        self.session.mount("https://", HTTPAdapter(max_retries=retry, pool_maxsize=1))
+
+        self.cond = threading.Condition()
+        self.pending: Optional[bool] = None
+        self.last_sent: Optional[bool] = None
+        self.running = True
+
+        # stats
+        self.queue_depth = 0  # updates waiting to be sent, before coalescing
+        self.coalesced = 0
+        self.sent = 0
+        self.failed = 0
+        self.last_latency: Optional[float] = None
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+        self.last_stats = time.monotonic()
+        registry.gauge(
+            "monitor_http_queue_depth",
+            "Updates waiting to be sent to the HTTP endpoint, before coalescing",
+            lambda: self.queue_depth,
+        )
+
+        self.thread = threading.Thread(
+            target=self._work, name="http-publisher", daemon=True
+        )
+        self.thread.start()
+
+    def submit(self, open: bool) -> None:
+        """
+        Queue the door state to be sent, replacing any state still waiting.
+        This never blocks on the network.
+
+        Arguments:
+            - open: bool - whether the door is currently open
+        """
+        with self.cond:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = open
+            self.queue_depth += 1
+            self.cond.notify()
+
+    def _work(self) -> None:
+        while True:
+            with self.cond:
+                while self.running and self.pending is None:
+                    # woken up to log the stats even when no updates arrive
+                    if not self.cond.wait(self._until_stats()):
+                        self._maybe_log_stats()
+                if self.pending is None:
+                    return
+                open = self.pending
+                self.pending = None
+                self.queue_depth = 0
+
+            if open != self.last_sent:
+                self._post(open)
+            self._maybe_log_stats()
+
+    def _until_stats(self) -> float:
+        return max(self.last_stats + self.stats_every - time.monotonic(), 0.0)
+
+    def _maybe_log_stats(self) -> None:
+        if self._until_stats() == 0:
+            self.log_stats()
+
+    def _post(self, open: bool) -> None:
+        start = time.perf_counter()
+        try:
+            r = self.session.post(
+                self.endpoint,
+                data=("open" if open else "closed"),
+                timeout=self.timeout,
+            )
+            r.raise_for_status()
+        except requests.RequestException:
+            self.failed += 1
+            send_failures.inc()
+            logger.info("Failed to send to HTTP endpoint %s", self.endpoint)
+            return
+
+        latency = time.perf_counter() - start
+        send_time.observe(latency)
+        self.last_sent = open
+        self.sent += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+        logger.debug(
+            "Sent %s to HTTP endpoint in %.1f ms",
+            "open" if open else "closed",
+            latency * 1000,
+        )
+
+    def stats(self) -> dict:
+        """
+        Return the queue depth and send latency of the publisher, with latencies in seconds
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "coalesced": self.coalesced,
+            "sent": self.sent,
+            "failed": self.failed,
+            "last_latency": self.last_latency,
+            "avg_latency": self.total_latency / self.sent if self.sent else None,
+            "max_latency": self.max_latency,
+        }
+
+    def log_stats(self) -> None:
+        """
+        Log the queue depth and send latency of the publisher
+        """
+        self.last_stats = time.monotonic()
+        stats = self.stats()
+        logger.info(
+            "HTTP endpoint: %d sent, %d failed, %d coalesced, %d waiting, "
+            "latency last %s, avg %s, max %.1f ms",
+            stats["sent"],
+            stats["failed"],
+            stats["coalesced"],
+            stats["queue_depth"],
+            format_ms(stats["last_latency"]),
+            format_ms(stats["avg_latency"]),
+            stats["max_latency"] * 1000,
+        )
+
+    def close(self, timeout: float = 1.0) -> None:
+        """
+        Stop the worker thread, waiting up to `timeout` seconds for an update
+        that is still waiting to be sent
+        """
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join(timeout)
+        self.session.close()
+        self.log_stats()
+
+
+def format_ms(seconds: Optional[float]) -> str:
+    return f"{seconds * 1000:.1f} ms" if seconds is not None else "n/a"
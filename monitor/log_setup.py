@@ -0,0 +1,95 @@
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime
+from typing import Optional
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats each record as a compact JSON object on a single line, such as
+    `{"t":"2024-01-01T12:00:00.000","lvl":"INFO","name":"__main__","msg":"Started"}`
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "t": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "lvl": record.levelname,
+            "name": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"))
+
+
+def gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def gzip_rotator(source: str, dest: str) -> None:
+    """
+    Compress a rotated log segment, replacing the uncompressed file
+    """
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def configure_logging(
+    path: str,
+    level: int = logging.DEBUG,
+    json_format: bool = False,
+    max_bytes: int = 1 << 20,
+    backup_count: int = 5,
+    when: Optional[str] = None,
+) -> logging.handlers.QueueListener:
+    """
+    Configure the root logger to log to a rotating file without ever
+    blocking the caller on disk.
+
+    Records are put on an in-memory queue, and a background thread writes
+    them to the file. Once the file grows past `max_bytes` (or, if `when` is
+    given, at that interval instead) it is rotated, and old segments are
+    gzip compressed. The file is appended to, so a restart keeps the
+    previous run's log. Returns the listener, which should be stopped at
+    exit to flush any remaining records.
+
+    Arguments:
+        - path: str - the log file
+        - level: int - the level of the root logger
+        - json_format: bool - whether to write JSON lines instead of plain text
+        - max_bytes: int - the size at which the log file is rotated
+        - backup_count: int - how many rotated segments to keep
+        - when: Optional[str] - rotate on a schedule rather than by size, using the
+            `when` values of `logging.handlers.TimedRotatingFileHandler`, such as "midnight"
+    """
+    if when is not None:
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=backup_count
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count
+        )
+    handler.namer = gzip_namer
+    handler.rotator = gzip_rotator
+    if json_format:
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(
+            logging.Formatter("%(asctime)s:%(levelname)s:%(name)s:%(message)s")
+        )
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
@@ -1,47 +1,114 @@
-from physical_monitor import RPIMonitor, DummyMonitor
-import socket
-from urllib.parse import urlparse
-import requests
+from physical_monitor import (
+    RPIMonitor,
+    DummyMonitor,
+    ReplayMonitor,
+    MonitorGroup,
+    load_trace,
+)
+from transport import encode_frame, session_from_config
+from http_publisher import HTTPPublisher
+from outbox import Outbox
+from log_setup import configure_logging
+from filters import filter_from_config
+from metrics import registry
 import dotenv
 import logging
 from datetime import datetime
 import os
+import signal
+import time
+from typing import Optional, Mapping, Union, Dict
 
 logger = logging.getLogger(__name__)
 
 
 class StatusUpdater:
-    def __init__(self):
-        self.vals = dotenv.dotenv_values()
+    def __init__(self, vals: Optional[Mapping[str, str]] = None):
+        """
+        Initialize the status updater
+
+        Arguments:
+            - vals: Optional[Mapping[str, str]] - the configuration to use. Defaults to the `.env` values
+        """
+        if vals is None:
+            vals = dotenv.dotenv_values()
+        self.vals = vals
         self.last_openness = None
         self.last_tcp_attempt_failed = False
-        vals = dotenv.dotenv_values()
-        # https://bugs.python.org/issue754016
-        # We could use rsplit(':', 1) with some extra checks for IPv6, but that's more logic ensure correct
-        tcp_endpoint = urlparse('//' + vals["DOOR_TCP_ENDPOINT"])
-        self.tcp_host = tcp_endpoint.hostname
-        self.tcp_port = tcp_endpoint.port
         self.http_endpoint = vals.get("DOOR_HTTP_ENDPOINT", None)
+        # HTTP updates are sent from a background thread so they never stall the monitor
+        self.http_publisher = (
+            HTTPPublisher(self.http_endpoint) if self.http_endpoint is not None else None
+        )
+
+        # a single connection (or shared memory block) is kept open and reused for every update
+        self.session = session_from_config(vals)
+        self.seq = 0
+
+        # door changes that couldn't be delivered are spooled to disk and replayed on reconnect
+        self.last_tcp_openness: Dict[Optional[str], bool] = {}
+        self.outbox = Outbox(
+            vals.get(
+                "OUTBOX_LOCATION", os.path.join(os.path.dirname(__file__), "outbox.spool")
+            )
+        )
+        registry.gauge(
+            "monitor_outbox_pending",
+            "Door changes spooled to the outbox, waiting for the bot",
+            lambda: self.outbox.pending,
+        )
+
+    def __call__(self, open: Union[bool, Mapping[str, bool]]):
+        """
+        Send the door state to the server, and to the HTTP endpoint if it changed
+
+        Arguments:
+            - open: Union[bool, Mapping[str, bool]] - whether the door is open or, from a
+                MonitorGroup, whether each sensor's door is open by sensor id
+        """
+        states = open if isinstance(open, Mapping) else {None: open}
+        self.send_tcp_update(states, time.time())
 
-    def __call__(self, open: bool):
-        self.send_tcp_update(open)
+        # the HTTP endpoint only takes a single door, so it gets the first sensor
+        open = next(iter(states.values()))
         if self.last_openness != open:
             self.last_openness = open
 
             self.send_http_update(open)
 
-    def send_tcp_update(self, open: bool):
+    def send_tcp_update(self, states: Mapping[Optional[str], bool], timestamp: float):
         """
-        Post a status update to the server
+        Post a status update to the server. Every sensor's record is sent in a single batch.
 
         Arguments:
-            - open: bool - whether the door is currently open
+            - states: Mapping[Optional[str], bool] - whether each door is currently open, by
+                sensor id. A sensor id of None means the monitor has only one sensor.
+            - timestamp: float - the seconds since the epoch when the doors were read
         """
+        frames = []
+        changed = []
+        for sensor, open in states.items():
+            self.seq += 1
+            frame = encode_frame(self.seq, timestamp, open, sensor)
+            frames.append(frame)
+            if open != self.last_tcp_openness.get(sensor):
+                changed.append(frame)
+            self.last_tcp_openness[sensor] = open
 
-        s = socket.socket()
-        try:
-            s.connect((self.tcp_host, self.tcp_port))
-        except ConnectionRefusedError:
+        # reading the spool is wasted while the session is backing off, since the send will fail
+        replay = self.outbox.pending > 0 and self.session.ready()
+        if len(changed) > 0 or replay:
+            # a transition mustn't be sent into a connection the server already closed
+            self.session.check()
+        # spooled updates go out ahead of the current ones, all in a single send
+        data = b"".join(frames)
+        if replay:
+            data = self.outbox.read() + data
+
+        if not self.session.send(data):
+            for frame in changed:
+                self.outbox.append(frame)
+            self.outbox.maybe_sync()
             if not self.last_tcp_attempt_failed:
                 logger.info(
                     "Failed to connect to the server since %s",
@@ -50,9 +117,9 @@ class StatusUpdater:
                 self.last_tcp_attempt_failed = True
             return
 
-        # make sure we sent the value
-        msg = str(open).encode()
-        assert s.send(msg) == len(msg)
+        if replay:
+            logger.info("Replayed %d spooled updates", self.outbox.pending)
+            self.outbox.clear()
         if self.last_tcp_attempt_failed:
             self.last_tcp_attempt_failed = False
             logger.info(
@@ -60,26 +127,33 @@ class StatusUpdater:
             )
 
     def send_http_update(self, open: bool):
-        if self.http_endpoint is None:
+        if self.http_publisher is None:
             return
 
-        try:
-            headers = {"Content-Type": "text/plain"}
-            r = requests.post(self.http_endpoint, headers=headers, data=("open" if open else "closed"))
-            r.raise_for_status()
-        except (requests.ConnectionError, requests.HTTPError):
-            logger.info(
-                "Failed to send to HTTP endpoint %s",
-                self.http_endpoint
-            )
-            # Do not set last_attempt_failed, this is an optional secondary mechanism
+        # Failures are only logged by the publisher, this is an optional secondary mechanism
+        self.http_publisher.submit(open)
+
+    def close(self):
+        """
+        Close the connection to the server, stop the HTTP publisher and sync the outbox
+        """
+        self.session.close()
+        self.outbox.close()
+        if self.http_publisher is not None:
+            self.http_publisher.close()
+
 
 def main():
-    # configure root logger
-    logging.basicConfig(
-        filename=os.path.join(os.path.dirname(__file__), "monitor.log"),
-        level=logging.DEBUG,
-        filemode="w",
+    vals = dotenv.dotenv_values()
+
+    # configure root logger, writing to disk from a background thread
+    log_listener = configure_logging(
+        os.path.join(os.path.dirname(__file__), "monitor.log"),
+        level=logging.getLevelName(vals.get("LOG_LEVEL", "DEBUG").upper()),
+        json_format=vals.get("LOG_FORMAT", "text").lower() == "json",
+        max_bytes=int(vals.get("LOG_MAX_BYTES", 1 << 20)),
+        backup_count=int(vals.get("LOG_BACKUPS", 5)),
+        when=vals.get("LOG_ROTATE_WHEN", None),
     )
     logger.info("Started monitor service")
 
@@ -87,16 +161,98 @@ def main():
     post_status = StatusUpdater()
 
     # load correct monitor
-    vals = dotenv.dotenv_values()
+    refresh_every = float(vals["REFRESH_EVERY"])
+    heartbeat_every = vals.get("HEARTBEAT_EVERY", None)
+    if heartbeat_every is not None:
+        heartbeat_every = float(heartbeat_every)
+    # several sensors are configured as id:pin pairs, and read together on one loop
+    sensors = {}
+    for sensor in vals.get("DOOR_SENSORS", "").split(","):
+        if len(sensor.strip()) > 0:
+            sensor_id, pin = sensor.strip().split(":")
+            sensors[sensor_id] = int(pin)
     try:
-        monitor = RPIMonitor(float(vals["REFRESH_EVERY"]), post_status, logger)
-        logger.info("Using RPIMonitor.")
+        if "REPLAY_TRACE" in vals:
+            # replaying a recorded trace instead of reading a sensor
+            monitor = ReplayMonitor(
+                refresh_every,
+                post_status,
+                logger,
+                load_trace(vals["REPLAY_TRACE"]),
+                float(vals.get("REPLAY_SPEEDUP", 1)),
+                sample_filter=filter_from_config(vals),
+            )
+            logger.info("Using ReplayMonitor.")
+        elif len(sensors) > 0:
+            monitors = {
+                sensor_id: RPIMonitor(
+                    refresh_every,
+                    None,
+                    logger,
+                    heartbeat_every,
+                    pin,
+                    filter_from_config(vals),
+                )
+                for sensor_id, pin in sensors.items()
+            }
+            monitor = MonitorGroup(
+                refresh_every, post_status, logger, monitors, heartbeat_every
+            )
+            logger.info("Using RPIMonitor for sensors %s.", ", ".join(sensors))
+        else:
+            monitor = RPIMonitor(
+                refresh_every,
+                post_status,
+                logger,
+                heartbeat_every,
+                sample_filter=filter_from_config(vals),
+            )
+            logger.info("Using RPIMonitor.")
     except ModuleNotFoundError:
         # testing on a machine that doesn't have Raspberry pi GPIO pins
-        monitor = DummyMonitor(float(vals["REFRESH_EVERY"]), post_status, logger)
+        if len(sensors) > 0:
+            monitors = {
+                sensor_id: DummyMonitor(
+                    refresh_every, None, logger, sample_filter=filter_from_config(vals)
+                )
+                for sensor_id in sensors
+            }
+            monitor = MonitorGroup(
+                refresh_every, post_status, logger, monitors, heartbeat_every
+            )
+        else:
+            monitor = DummyMonitor(
+                refresh_every,
+                post_status,
+                logger,
+                heartbeat_every,
+                filter_from_config(vals),
+            )
         logger.info("Using DummyMonitor.")
+    registry.gauge(
+        "monitor_bounces_suppressed",
+        "Sensor bounces dropped by the filters",
+        lambda: monitor.suppressed,
+    )
+    if "METRICS_PORT" in vals:
+        registry.serve(int(vals["METRICS_PORT"]))
+    if "METRICS_FILE" in vals:
+        registry.write_every(vals["METRICS_FILE"], float(vals.get("METRICS_EVERY", 10)))
+
+    if monitor.edge_triggered:
+        logger.info("Edge triggered, with a heartbeat every %s seconds.", heartbeat_every)
+    # systemd stops the monitor with SIGTERM, which would otherwise skip the cleanup below,
+    # losing the log records still queued and any outbox frames not yet synced. It's turned
+    # into a KeyboardInterrupt, which the monitor already stops on, since stopping it from
+    # the handler could deadlock on a lock the interrupted code holds
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     # begin process
-    monitor.start()
+    try:
+        monitor.start()
+    finally:
+        post_status.close()
+        registry.stop()
+        log_listener.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# in seconds, from half a millisecond up to five seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class Counter:
+    """
+    A value that only goes up, such as a number of reconnects
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.value}"]
+
+
+class Gauge:
+    """
+    A value that is read from a function whenever the metrics are collected,
+    such as the number of frames waiting in the outbox
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.read()}"]
+
+
+class Histogram:
+    """
+    Counts observations, such as latencies, into buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = list(buckets)
+        # the last count is for observations above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Metrics:
+    """
+    A registry of the monitor's metrics, which can be served in the Prometheus
+    text format on localhost, or periodically written to a file.
+
+    Metrics are only ever updated with plain additions, so recording them costs
+    next to nothing whether or not anything reads them.
+    """
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, object] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.stopped = threading.Event()
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help))
+
+    def histogram(
+        self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        # gauges are re-registered by whatever owns the value being read
+        self.metrics[name] = Gauge(name, help, read)
+        return self.metrics[name]
+
+    def render(self) -> str:
+        """
+        Return every metric in the Prometheus text format
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int) -> None:
+        """
+        Serve the metrics at http://localhost:`port`/metrics from a background thread
+
+        Arguments:
+            - port: int - the port to listen on
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # don't log every scrape
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics-server", daemon=True
+        ).start()
+        logger.info("Serving metrics on localhost:%d", port)
+
+    def write_every(self, path: str, interval: float) -> None:
+        """
+        Write the metrics to `path` every `interval` seconds from a background thread.
+        The file is replaced atomically, so readers never see a partial write.
+
+        Arguments:
+            - path: str - the file to write
+            - interval: float - how often, in seconds, to write the file
+        """
+
+        def write():
+            while not self.stopped.wait(interval):
+                try:
+                    with open(path + ".tmp", "w") as f:
+                        f.write(self.render())
+                    os.replace(path + ".tmp", path)
+                except OSError:
+                    logger.exception("Failed to write metrics to %s", path)
+
+        threading.Thread(target=write, name="metrics-writer", daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stop serving and writing the metrics
+        """
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+
+# the monitor's metrics, shared by every module
+registry = Metrics()
@@ -0,0 +1,119 @@
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    An append-only spool file of frames that couldn't be delivered.
+
+    Frames are written to the file as they fail to send, so they survive the
+    monitor being stopped or killed, and synced to disk in batches, either once
+    `sync_every` frames are waiting or `sync_interval` seconds have passed, so
+    a power cut loses at most one batch.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sync_every: int = 16,
+        sync_interval: float = 5.0,
+        max_bytes: int = 1 << 20,
+    ) -> None:
+        """
+        Open the spool file, creating it if it doesn't exist
+
+        Arguments:
+            - path: str - where to keep the spool file
+            - sync_every: int - the number of frames to batch before syncing to disk
+            - sync_interval: float - the most seconds a frame waits before being synced to disk
+            - max_bytes: int - the largest the spool file is allowed to grow. Frames
+                appended past this size are dropped.
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.max_bytes = max_bytes
+
+        self.file = open(path, "ab")
+        self.size = self.file.tell()
+        self.pending = 0
+        if self.size > 0:
+            with open(path, "rb") as f:
+                contents = f.read()
+            self.pending = contents.count(b"\n")
+            if not contents.endswith(b"\n"):
+                # a partially written frame from a crash; terminate it so the
+                # receiver discards it instead of merging it with the next frame
+                self.file.write(b"\n")
+                self.size += 1
+                self.pending += 1
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def append(self, frame: bytes) -> None:
+        """
+        Spool a frame to be sent later
+
+        Arguments:
+            - frame: bytes - the already framed data
+        """
+        if self.size + len(frame) > self.max_bytes:
+            logger.warning("Outbox is full, dropping update")
+            return
+        self.file.write(frame)
+        # handed to the OS right away, so a killed process loses nothing, and only the fsync is batched
+        self.file.flush()
+        self.size += len(frame)
+        self.pending += 1
+        self.unsynced += 1
+        self.maybe_sync()
+
+    def maybe_sync(self) -> None:
+        """
+        Sync spooled frames to disk if enough of them are waiting, or they have waited long enough
+        """
+        if self.unsynced == 0:
+            return
+        if (
+            self.unsynced >= self.sync_every
+            or time.monotonic() - self.last_sync >= self.sync_interval
+        ):
+            self.sync()
+
+    def sync(self) -> None:
+        """
+        Sync all spooled frames to disk
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def read(self) -> bytes:
+        """
+        Return every spooled frame, oldest first, as a single batch
+        """
+        self.file.flush()
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def clear(self) -> None:
+        """
+        Discard every spooled frame, once they have been delivered
+        """
+        self.file.truncate(0)
+        self.file.seek(0)
+        os.fsync(self.file.fileno())
+        self.size = 0
+        self.pending = 0
+        self.unsynced = 0
+
+    def close(self) -> None:
+        """
+        Sync and close the spool file
+        """
+        self.sync()
+        self.file.close()
@@ -1,11 +1,23 @@
-from typing import Callable
+from typing import Callable, Optional, List, Tuple, Mapping, Dict
 from abc import ABC, abstractmethod
+import threading
 import time
+import json
 from logging import Logger
 from datetime import datetime
 import random
+from filters import Filter
+from metrics import registry
 
-# Define the GPIO pin number to which the sensor is connected
+loop_jitter = registry.histogram(
+    "monitor_loop_jitter_seconds",
+    "How much later than scheduled the monitor loop woke up",
+)
+read_time = registry.histogram(
+    "monitor_read_seconds", "How long it took to read a sensor's value"
+)
+
+# Define the GPIO pin number to which the sensor is connected, when there is only one
 DOOR_SENSOR_PIN = 16
 
 
@@ -15,7 +27,12 @@ class PhysicalMonitor(ABC):
     """
 
     def __init__(
-        self, refresh_every: float, callback: Callable[[bool], None], logger: Logger
+        self,
+        refresh_every: float,
+        callback: Callable[[bool], None],
+        logger: Logger,
+        heartbeat_every: Optional[float] = None,
+        sample_filter: Optional[Filter] = None,
     ) -> None:
         """
         Initialize the physical monitor.
@@ -24,11 +41,24 @@ class PhysicalMonitor(ABC):
             - refresh_every - how often, in seconds, to send the current value
             - callback - a function that takes a boolean that represents the
                 new state of the physical monitor.
+            - heartbeat_every - if given, the monitor is edge triggered: the value
+                is only sent when `notify` is called, plus once every `heartbeat_every`
+                seconds so the receiver knows the monitor is still alive. Otherwise the
+                value is polled every `refresh_every` seconds.
+            - sample_filter - if given, every sample is run through this filter before
+                being sent, to drop bounces of the sensor
         """
         self.refresh_every = refresh_every
+        self.heartbeat_every = heartbeat_every
+        self.sample_filter = sample_filter
         self.callback = callback
         self.run = False
         self.logger = logger
+        self.changed = threading.Event()
+
+    @property
+    def edge_triggered(self) -> bool:
+        return self.heartbeat_every is not None
 
     @abstractmethod
     def value(self) -> bool:
@@ -36,19 +66,79 @@ class PhysicalMonitor(ABC):
         Returns the current state, either True for open or False for closed
         """
 
+    def read(self) -> bool:
+        """
+        Returns the current state, after running it through the filter if there is one
+        """
+        start = time.perf_counter()
+        val = self.value()
+        read_time.observe(time.perf_counter() - start)
+        if self.sample_filter is not None:
+            val = self.sample_filter(val, time.monotonic())
+        return val
+
+    def next_check(self) -> Optional[float]:
+        """
+        Returns how many seconds until the filter needs another sample to settle,
+        or None if it doesn't
+        """
+        if self.sample_filter is None:
+            return None
+        return self.sample_filter.next_check(time.monotonic())
+
+    @property
+    def suppressed(self) -> int:
+        """
+        The number of sensor bounces the filter has suppressed
+        """
+        return 0 if self.sample_filter is None else self.sample_filter.suppressed
+
+    def notify(self) -> None:
+        """
+        Wake up the monitor so that the current value is sent right away.
+        This is safe to call from any thread.
+        """
+        self.changed.set()
+
     def start(self) -> None:
         """
         Initialize running, blocking the current thread
         """
         if not self.run:
             self.run = True
+            interval = (
+                self.heartbeat_every if self.edge_triggered else self.refresh_every
+            )
             try:
                 while self.run:
-                    val = self.value()
+                    # clear before reading so an edge during the read isn't missed
+                    self.changed.clear()
+                    val = self.read()
                     self.callback(val)
-                    time.sleep(self.refresh_every)
+                    # wake up early if the filter is waiting to settle
+                    check = self.next_check()
+                    self.wait(interval if check is None else min(interval, check))
             except KeyboardInterrupt:
                 self.logger.info("Stopping due to keyboard interrupt.")
+            if self.suppressed > 0:
+                self.logger.info("Suppressed %d sensor bounces.", self.suppressed)
+
+    def wait(self, interval: float) -> None:
+        """
+        Block until the next value should be sent, which is either after `interval`
+        seconds or as soon as `notify` is called
+        """
+        start = time.monotonic()
+        # in polling mode nothing sets the event, so this is a plain sleep
+        if not self.changed.wait(interval):
+            loop_jitter.observe(max(time.monotonic() - start - interval, 0))
+
+    def stop(self) -> None:
+        """
+        Stop running after the current iteration
+        """
+        self.run = False
+        self.notify()
 
 
 class DummyMonitor(PhysicalMonitor):
@@ -57,14 +147,181 @@ class DummyMonitor(PhysicalMonitor):
     """
 
     def __init__(
-        self, refresh_every: float, callback: Callable[[bool], None], logger: Logger
+        self,
+        refresh_every: float,
+        callback: Callable[[bool], None],
+        logger: Logger,
+        heartbeat_every: Optional[float] = None,
+        sample_filter: Optional[Filter] = None,
     ):
-        super().__init__(refresh_every, callback, logger)
+        super().__init__(
+            refresh_every, callback, logger, heartbeat_every, sample_filter
+        )
 
     def value(self):
         return random.randint(0, 1) == 0
 
 
+def load_trace(path: str) -> List[Tuple[float, bool]]:
+    """
+    Load a trace of door changes from a file, as a list of (offset, open) pairs
+    where offset is the seconds since the first change.
+
+    Each line of the file is either `timestamp,open` (with open being 1/0 or true/false),
+    or a JSON frame as sent by the monitor, so an outbox spool file can be replayed directly.
+
+    Arguments:
+        - path: str - the file to read
+    """
+    points = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                points.append((float(record["ts"]), bool(record["open"])))
+            else:
+                timestamp, is_open = line.split(",")
+                points.append(
+                    (float(timestamp), is_open.strip().lower() in ("1", "true"))
+                )
+
+    if len(points) == 0:
+        return []
+    start = points[0][0]
+    return [(timestamp - start, is_open) for timestamp, is_open in points]
+
+
+def synthetic_trace(
+    count: int, rate: float, seed: Optional[int] = None
+) -> List[Tuple[float, bool]]:
+    """
+    Generate a trace of `count` door changes, alternating between open and closed,
+    arriving randomly at an average of `rate` changes per second.
+
+    Arguments:
+        - count: int - the number of changes
+        - rate: float - the average number of changes per second
+        - seed: Optional[int] - the seed for the random number generator, for repeatable traces
+    """
+    rng = random.Random(seed)
+    offset = 0.0
+    trace = []
+    for i in range(count):
+        trace.append((offset, i % 2 == 0))
+        offset += rng.expovariate(rate)
+    return trace
+
+
+class ReplayMonitor(PhysicalMonitor):
+    """
+    Monitor that replays a trace of door changes, optionally sped up.
+    It sends a value for every change in the trace, and keeps sending the
+    current value every `refresh_every` seconds between changes. The monitor
+    stops once the trace is over.
+    """
+
+    def __init__(
+        self,
+        refresh_every: float,
+        callback: Callable[[bool], None],
+        logger: Logger,
+        trace: List[Tuple[float, bool]],
+        speedup: float = 1.0,
+        initial: bool = False,
+        sample_filter: Optional[Filter] = None,
+    ):
+        """
+        Initialize the replay monitor
+
+        Arguments:
+            - trace: List[Tuple[float, bool]] - (offset, open) pairs, where offset is the
+                seconds since the start of the trace, as returned by `load_trace`
+            - speedup: float - how many times faster than real time to replay the trace
+            - initial: bool - the door state before the first change in the trace
+        """
+        super().__init__(refresh_every, callback, logger, sample_filter=sample_filter)
+        self.trace = trace
+        self.speedup = speedup
+        self.state = initial
+        self.index = 0
+        self.start_time: Optional[float] = None
+
+    def value(self):
+        return self.state
+
+    def wait(self, interval: float) -> None:
+        if self.start_time is None:
+            self.start_time = time.monotonic()
+        if self.index >= len(self.trace):
+            self.logger.info("Finished replaying %d changes.", len(self.trace))
+            self.run = False
+            return
+
+        due = self.start_time + self.trace[self.index][0] / self.speedup
+        delay = due - time.monotonic()
+        if delay > interval:
+            # nothing changes before the next refresh
+            self.changed.wait(interval)
+            return
+        if delay > 0:
+            self.changed.wait(delay)
+        if self.run:
+            self.state = self.trace[self.index][1]
+            self.index += 1
+
+
+class MonitorGroup(PhysicalMonitor):
+    """
+    Monitor that reads several monitors, each identified by a sensor id, on a single loop.
+    Its callback receives every sensor's state at once, as a mapping from sensor id to
+    whether that door is open. The monitors in the group are never started themselves,
+    only read, and any of them calling `notify` wakes the whole group.
+    """
+
+    def __init__(
+        self,
+        refresh_every: float,
+        callback: Callable[[Mapping[str, bool]], None],
+        logger: Logger,
+        monitors: Mapping[str, PhysicalMonitor],
+        heartbeat_every: Optional[float] = None,
+    ):
+        """
+        Initialize the monitor group
+
+        Arguments:
+            - monitors: Mapping[str, PhysicalMonitor] - the monitors to read, by sensor id
+        """
+        super().__init__(refresh_every, callback, logger, heartbeat_every)
+        self.monitors = dict(monitors)
+        for monitor in self.monitors.values():
+            monitor.changed = self.changed
+
+    def value(self) -> Dict[str, bool]:
+        """
+        Returns the current state of every sensor, by sensor id, after each monitor's filter
+        """
+        return {
+            sensor_id: monitor.read() for sensor_id, monitor in self.monitors.items()
+        }
+
+    def read(self) -> Dict[str, bool]:
+        # each monitor times and filters its own read
+        return self.value()
+
+    def next_check(self) -> Optional[float]:
+        checks = [monitor.next_check() for monitor in self.monitors.values()]
+        checks = [check for check in checks if check is not None]
+        return min(checks) if len(checks) > 0 else None
+
+    @property
+    def suppressed(self) -> int:
+        return sum(monitor.suppressed for monitor in self.monitors.values())
+
+
 class RPIMonitor(PhysicalMonitor):
     """
     Physical monitor that uses magnetic door sensors
@@ -72,18 +329,41 @@ class RPIMonitor(PhysicalMonitor):
     """
 
     def __init__(
-        self, refresh_every: float, callback: Callable[[bool], None], logger: Logger
+        self,
+        refresh_every: float,
+        callback: Callable[[bool], None],
+        logger: Logger,
+        heartbeat_every: Optional[float] = None,
+        pin: int = DOOR_SENSOR_PIN,
+        sample_filter: Optional[Filter] = None,
     ):
+        """
+        Initialize the monitor
+
+        Arguments:
+            - pin: int - the GPIO pin the door sensor is wired to
+        """
         from gpiozero import Button
 
-        super().__init__(refresh_every, callback, logger)
-        self.button = Button(DOOR_SENSOR_PIN)
-        self.button.when_pressed = lambda: self.logger.debug(
-            "Door closed at %s", datetime.now().isoformat()
+        super().__init__(
+            refresh_every, callback, logger, heartbeat_every, sample_filter
+        )
+        self.pin = pin
+        self.button = Button(pin)
+        self.button.when_pressed = self.on_closed
+        self.button.when_released = self.on_opened
+
+    def on_closed(self):
+        self.logger.debug(
+            "Door on GPIO %d closed at %s", self.pin, datetime.now().isoformat()
         )
-        self.button.when_released = lambda: self.logger.debug(
-            "Door open at %s", datetime.now().isoformat()
+        self.notify()
+
+    def on_opened(self):
+        self.logger.debug(
+            "Door on GPIO %d open at %s", self.pin, datetime.now().isoformat()
         )
+        self.notify()
 
     def value(self):
         return self.button.value == 0  # 1 if pressed (closed), 0 if not (open)
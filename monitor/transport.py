@@ -0,0 +1,395 @@
+import json
+import logging
+import mmap
+import os
+import select
+import socket
+import struct
+import time
+import zlib
+from typing import Mapping, Optional, Union
+from urllib.parse import urlparse
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+send_time = registry.histogram(
+    "monitor_send_seconds", "How long it took to send a batch of frames to the bot"
+)
+bytes_sent = registry.counter(
+    "monitor_bytes_sent_total", "Bytes sent to the bot"
+)
+connects = registry.counter(
+    "monitor_connects_total", "Connections opened to the bot"
+)
+connect_failures = registry.counter(
+    "monitor_connect_failures_total", "Failed attempts to connect to the bot"
+)
+
+# the shared memory status block starts with the total bytes of frames the monitor
+# has ever written to it and the total bytes the bot has read, followed by a ring
+# buffer of the frames themselves
+SHM_HEADER = struct.Struct("<QQ")
+# each send is stored as a record: where it starts in the stream, how long it is, and
+# a CRC32 of both plus the frames
+SHM_RECORD = struct.Struct("<QII")
+# large enough for a full outbox to be replayed in a single send
+SHM_RING_SIZE = 2 << 20
+
+
+def shm_checksum(position: int, data: bytes) -> int:
+    """
+    Return the checksum of a shared memory record starting at `position` holding `data`
+    """
+    return zlib.crc32(data, zlib.crc32(struct.pack("<QI", position, len(data))))
+
+
+def encode_frame(
+    seq: int, timestamp: float, open: bool, sensor: Optional[str] = None
+) -> bytes:
+    """
+    Encode a single door status record as a frame.
+
+    Frames are newline terminated utf8 JSON objects of the form
+    `{"seq": 1, "ts": 1700000000.25, "open": true}`, so the receiving
+    side can split a byte stream back into records regardless of how
+    the stream was chunked. Frames from a monitor with several sensors
+    also carry the sensor id, as in `{..., "sensor": "front"}`.
+
+    Arguments:
+        - seq: int - monotonically increasing sequence number of the record
+        - timestamp: float - the seconds since the epoch when the sensor was read
+        - open: bool - whether the door was open
+        - sensor: Optional[str] - the id of the sensor that was read, if there are several
+    """
+    record = {"seq": seq, "ts": round(timestamp, 6), "open": open}
+    if sensor is not None:
+        record["sensor"] = sensor
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode()
+
+
+class TCPSession:
+    """
+    A long lived TCP connection to the bot.
+
+    The connection is opened lazily on the first send and reused for every
+    send after that. If the connection drops, it is reopened on a later send,
+    waiting an exponentially growing amount of time between failed attempts.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 2.0,
+    ) -> None:
+        """
+        Initialize the session. No connection is made until the first send.
+
+        Arguments:
+            - host: str - the host to connect to
+            - port: int - the port to connect to
+            - min_backoff: float - seconds to wait after the first failed connection attempt
+            - max_backoff: float - the most seconds to ever wait between connection attempts
+            - timeout: float - seconds to wait for a connect or send before giving up
+        """
+        self.host = host
+        self.port = port
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.address = f"{host}:{port}"
+
+        self.sock: Optional[socket.socket] = None
+        self.backoff = min_backoff
+        self.next_attempt = 0.0
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.sock is not None
+
+    def ready(self) -> bool:
+        """
+        Return whether a send would be attempted now, rather than fail while backing off
+        """
+        return self.sock is not None or time.monotonic() >= self.next_attempt
+
+    def _open_socket(self) -> socket.socket:
+        return socket.create_connection((self.host, self.port), timeout=self.timeout)
+
+    def _configure(self, sock: socket.socket) -> None:
+        """
+        Turn on TCP keepalive so a dead peer is noticed even when idle,
+        and disable Nagle's algorithm since every frame is tiny and latency sensitive.
+        """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # these options are only available on some platforms (notably linux)
+        for option, value in (("TCP_KEEPIDLE", 10), ("TCP_KEEPINTVL", 5), ("TCP_KEEPCNT", 3)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def _connect(self) -> bool:
+        """
+        Attempt to open the connection, unless we are still backing off
+        from a previous failure. Returns whether the session is connected.
+        """
+        now = time.monotonic()
+        if now < self.next_attempt:
+            return False
+
+        try:
+            sock = self._open_socket()
+        except OSError:
+            connect_failures.inc()
+            self.next_attempt = now + self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            return False
+
+        self._configure(sock)
+        self.sock = sock
+        self.backoff = self.min_backoff
+        self.reconnects += 1
+        connects.inc()
+        logger.debug("Opened connection to %s", self.address)
+        return True
+
+    def send(self, data: bytes) -> bool:
+        """
+        Send the data over the connection, connecting first if needed.
+        Returns whether the data was sent.
+
+        Arguments:
+            - data: bytes - the already framed data to send
+        """
+        if self.sock is None and not self._connect():
+            return False
+
+        start = time.perf_counter()
+        try:
+            self.sock.sendall(data)
+        except OSError:
+            logger.debug("Lost connection to %s", self.address)
+            self.close()
+            return False
+        send_time.observe(time.perf_counter() - start)
+        bytes_sent.inc(len(data))
+        return True
+
+    def check(self) -> bool:
+        """
+        Check, without blocking, that the peer hasn't closed the connection.
+        A send into a connection the peer already closed can appear to succeed,
+        so this should be called before sending anything that mustn't be lost.
+        Returns whether the session is still connected.
+        """
+        if self.sock is None:
+            return False
+
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if len(readable) == 0:
+                return True
+            # the bot never sends anything, so the only thing to read is the end of the stream
+            data = self.sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            data = b""
+        if len(data) == 0:
+            logger.debug("Connection to %s was closed", self.address)
+            self.close()
+            return False
+        return True
+
+    def close(self) -> None:
+        """
+        Close the connection, if one is open
+        """
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+
+class UnixSession(TCPSession):
+    """
+    A long lived connection to the bot over a Unix domain socket, for when both
+    run on the same host. It skips the TCP stack, but otherwise behaves exactly
+    like a TCPSession.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        min_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: float = 2.0,
+    ) -> None:
+        """
+        Initialize the session. No connection is made until the first send.
+
+        Arguments:
+            - path: str - the path of the socket the bot listens on
+            - min_backoff: float - seconds to wait after the first failed connection attempt
+            - max_backoff: float - the most seconds to ever wait between connection attempts
+            - timeout: float - seconds to wait for a connect or send before giving up
+        """
+        super().__init__(None, None, min_backoff, max_backoff, timeout)
+        self.path = path
+        self.address = path
+
+    def _open_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _configure(self, sock: socket.socket) -> None:
+        # a dead peer closes the socket right away, and there's no Nagle's algorithm to disable
+        pass
+
+
+class SharedMemorySession:
+    """
+    Writes frames into a memory mapped status block that the bot watches, for when both
+    run on the same host. There's no connection to set up or keep alive, and a send is
+    a copy into memory. The block should be on a tmpfs, such as `/dev/shm`, so it never
+    touches the disk.
+
+    The block is a `SHM_HEADER` of two counters followed by a ring buffer. Each send is
+    copied into the ring as a `SHM_RECORD` and its frames before the count of bytes
+    written is bumped, and the bot bumps the count of bytes read once it has handled them.
+    Python can't order the stores to the ring before the store to the counter, so on a
+    CPU that reorders stores, like the Pi's, the bot could see the counter before the
+    frames. The bot only reads a record once its checksum matches, and retries later
+    otherwise. A send that would overwrite frames the bot hasn't read fails, just like
+    a send to a bot that isn't listening, so frames are spooled to the outbox rather
+    than lost. The counters live in the block, so either side can restart without
+    losing its place.
+    """
+
+    def __init__(self, path: str, ring_size: int = SHM_RING_SIZE) -> None:
+        """
+        Initialize the session. The block is created or opened on the first send.
+
+        Arguments:
+            - path: str - the path of the file backing the block
+            - ring_size: int - the size of the ring buffer, in bytes, if the block is created.
+                An existing block keeps its size.
+        """
+        self.path = path
+        self.ring_size = ring_size
+        self.mm: Optional[mmap.mmap] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.mm is not None
+
+    def _connect(self) -> bool:
+        """
+        Map the block, creating it if it doesn't exist. Returns whether it's mapped.
+        """
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                size = os.fstat(fd).st_size
+                if size <= SHM_HEADER.size:
+                    size = SHM_HEADER.size + self.ring_size
+                    os.ftruncate(fd, size)
+                self.mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        except OSError:
+            connect_failures.inc()
+            logger.exception("Failed to map the status block %s", self.path)
+            return False
+
+        self.ring_size = len(self.mm) - SHM_HEADER.size
+        connects.inc()
+        logger.debug("Mapped the status block %s", self.path)
+        return True
+
+    def send(self, data: bytes) -> bool:
+        """
+        Write the data into the block, mapping it first if needed.
+        Returns whether the data was written.
+
+        Arguments:
+            - data: bytes - the already framed data to send
+        """
+        if self.mm is None and not self._connect():
+            return False
+
+        start = time.perf_counter()
+        written, read = SHM_HEADER.unpack_from(self.mm, 0)
+        record = SHM_RECORD.pack(written, len(data), shm_checksum(written, data)) + data
+        if written - read + len(record) > self.ring_size:
+            # the bot isn't keeping up, or isn't running
+            return False
+
+        position = written % self.ring_size
+        first = min(len(record), self.ring_size - position)
+        offset = SHM_HEADER.size + position
+        self.mm[offset : offset + first] = record[:first]
+        self.mm[SHM_HEADER.size : SHM_HEADER.size + len(record) - first] = record[first:]
+        # only publish the record once it's all in the ring
+        struct.pack_into("<Q", self.mm, 0, written + len(record))
+
+        send_time.observe(time.perf_counter() - start)
+        bytes_sent.inc(len(data))
+        return True
+
+    def ready(self) -> bool:
+        """
+        Return whether a send would be attempted now. Mapping the block is always attempted.
+        """
+        return True
+
+    def check(self) -> bool:
+        """
+        Return whether the block is mapped. Unlike a connection, it can't be closed by the bot.
+        """
+        return self.mm is not None
+
+    def close(self) -> None:
+        """
+        Unmap the block, if it's mapped. The file is left for the bot to finish reading.
+        """
+        if self.mm is not None:
+            try:
+                self.mm.close()
+            finally:
+                self.mm = None
+
+
+def session_from_config(
+    vals: Mapping[str, str]
+) -> Union[TCPSession, UnixSession, SharedMemorySession]:
+    """
+    Create the session to send frames to the bot over, from the `DOOR_TRANSPORT`
+    configuration value: `tcp` (the default) to `DOOR_TCP_ENDPOINT`, `unix` to the
+    socket at `DOOR_SOCKET_PATH`, or `shm` to the status block at `DOOR_SHM_PATH`.
+
+    Arguments:
+        - vals: Mapping[str, str] - the configuration values
+    """
+    transport = vals.get("DOOR_TRANSPORT", "tcp").lower()
+    if transport == "tcp":
+        # https://bugs.python.org/issue754016
+        # We could use rsplit(':', 1) with some extra checks for IPv6, but that's more logic ensure correct
+        tcp_endpoint = urlparse("//" + vals["DOOR_TCP_ENDPOINT"])
+        return TCPSession(tcp_endpoint.hostname, tcp_endpoint.port)
+    if transport == "unix":
+        return UnixSession(vals["DOOR_SOCKET_PATH"])
+    if transport == "shm":
+        return SharedMemorySession(vals["DOOR_SHM_PATH"])
+    raise ValueError(f"DOOR_TRANSPORT must be tcp, unix or shm, not {transport}")